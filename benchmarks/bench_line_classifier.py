@@ -0,0 +1,105 @@
+"""Compare line classification and parsing speed in lines per second.
+
+The legacy classifier is the chain of checks the parser used to run on every
+line: institute, branch, status, seat description, stage header, stage,
+rank, digits and score, one regex or lookup after another. classify_line
+dispatches on cheap features and runs at most one regex. The sample text is
+repeated up to --lines, about the size of the CAP2 dump by default.
+
+    python benchmarks/bench_line_classifier.py documents/round2_trimmed.txt
+"""
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from parse_admission_cutoffs_corrected import (
+    CutoffParser, SEAT_DESCRIPTIONS, STAGES, branch_pattern, category_pattern, classify_line,
+    institute_pattern, rank_pattern,
+)
+
+stage_pattern = re.compile(rf"^({'|'.join(STAGES)})$")
+
+
+def legacy_classify(line):
+    """The previous order of checks, returning the first that matched."""
+    if not line:
+        return "blank"
+    if line == "I-Non":
+        return "I-Non"
+    if institute_pattern.match(line):
+        return "institute"
+    if branch_pattern.match(line):
+        return "branch"
+    if line.startswith("Status:"):
+        return "status"
+    if line in SEAT_DESCRIPTIONS:
+        return "seat"
+    if line == "Stage":
+        return "stage header"
+    if stage_pattern.match(line):
+        return "stage"
+    if rank_pattern.match(line):
+        return "rank"
+    if line.isdigit():
+        return "digits"
+    if line.startswith("(") and line.endswith(")"):
+        return "score"
+    if category_pattern.fullmatch(line):
+        return "category"
+    return "text"
+
+
+def read_lines(sample_file, count):
+    """Read the sample's stripped lines, repeated until there are at least count."""
+    with open(sample_file, encoding="utf-8") as file:
+        sample = [line.strip() for line in file]
+    lines = []
+    while len(lines) < count:
+        lines.extend(sample)
+    return lines
+
+
+def lines_per_second(function, lines, repeat):
+    """Best rate over repeat runs of function(lines), measured in CPU time."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        function(lines)
+        best = min(best, time.process_time() - start)
+    return len(lines) / best
+
+
+def parse(lines):
+    for _ in CutoffParser().parse_lines((None, line) for line in lines):
+        pass
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("sample", help="Cutoff text file to build lines from")
+    arg_parser.add_argument("--lines", type=int, default=130000, help="Lines in the benchmark input")
+    arg_parser.add_argument("--repeat", type=int, default=7, help="Runs per measurement; the best is kept")
+    args = arg_parser.parse_args()
+    logging.getLogger("cutoffs").setLevel(logging.CRITICAL)
+
+    lines = read_lines(args.sample, args.lines)
+    mismatches = sum(legacy_classify(line) != classify_line(line)[0] for line in lines)
+    print(f"{len(lines)} lines, {mismatches} classified differently")
+
+    benchmarks = [
+        ("legacy classify", lambda lines: [legacy_classify(line) for line in lines]),
+        ("classify_line", lambda lines: [classify_line(line) for line in lines]),
+        ("full parse", parse),
+    ]
+    for name, function in benchmarks:
+        rate = lines_per_second(function, lines, args.repeat)
+        print(f"{name:<16} {rate:12,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
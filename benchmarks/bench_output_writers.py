@@ -0,0 +1,73 @@
+"""Compare output backend write times on a CAP2-sized cutoff table.
+
+The full CAP2 text (~110k-139k lines) parses to roughly 90k rows. The frame
+is built by parsing a sample text file and repeating its rows up to --rows.
+
+    python benchmarks/bench_output_writers.py documents/round2_trimmed.txt
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pandas as pd
+
+from cutoff_writers import WRITERS
+from parse_admission_cutoffs_corrected import CutoffParser, OUTPUT_COLUMNS
+from row_store import RowStore
+
+
+def build_frame(sample_file, rows):
+    """Parse the sample and repeat its rows until the store holds at least rows rows."""
+    sample = list(CutoffParser().iter_rows(sample_file))
+    store = RowStore()
+    while len(store) < rows:
+        store.extend(sample)
+    df = store.to_frame()
+    df.insert(0, "District", "Amravati")
+    df.insert(0, "Institute Name", "Government College of Engineering, Amravati")
+    df.insert(0, "Institute Code", "1002")
+    return df[OUTPUT_COLUMNS]
+
+
+def write_legacy_xlsx(df, output_file):
+    """The previous writer: pandas + openpyxl, then a per-cell text format loop."""
+    with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name="Cutoffs", index=False)
+        worksheet = writer.sheets["Cutoffs"]
+        for row in range(1, len(df) + 2):
+            worksheet[f"D{row}"].number_format = "@"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("sample", help="Cutoff text file to build rows from")
+    arg_parser.add_argument("--rows", type=int, default=90000, help="Rows in the benchmark table")
+    args = arg_parser.parse_args()
+    logging.getLogger("cutoffs").setLevel(logging.CRITICAL)
+
+    df = build_frame(args.sample, args.rows)
+    backends = [("xlsx (legacy)", write_legacy_xlsx, "xlsx")]
+    backends += [(name, writer, extension) for name, (writer, extension) in WRITERS.items()]
+
+    print(f"{len(df)} rows")
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name, writer, extension in backends:
+            output_file = os.path.join(output_dir, f"bench.{extension}")
+            start = time.perf_counter()
+            try:
+                writer(df, output_file)
+            except ImportError as e:
+                print(f"{name:<16} skipped ({e})")
+                continue
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(output_file) / 1024 / 1024
+            print(f"{name:<16} {elapsed:8.2f} s {size:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
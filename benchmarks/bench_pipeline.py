@@ -0,0 +1,192 @@
+"""Benchmark parsing, mapping and writing on synthetic CAP files of growing size.
+
+    python benchmarks/bench_pipeline.py --sizes 10k 100k 1M 10M --save bench.json
+    python benchmarks/bench_pipeline.py --baseline bench.json
+
+Each size is generated once with synthetic_cap.py into --work-dir and
+measured in a fresh process, so peak RSS is that of a single run. For every
+size the suite reports parse throughput (best of --rounds), peak RSS after
+parsing and overall, mapping time and write time per output format. The
+row count is checked against the one the generator expects.
+
+With --baseline, results are compared to a saved run and the exit status is
+1 if parse throughput fell or peak RSS grew by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from synthetic_cap import generate
+
+SIZE_SUFFIXES = {"k": 1000, "M": 1000000}
+
+
+def parse_size(text):
+    """Read a line count such as 10000, 10k or 10M."""
+    if text[-1:] in SIZE_SUFFIXES:
+        return int(float(text[:-1]) * SIZE_SUFFIXES[text[-1]])
+    return int(text)
+
+
+def peak_rss_mib():
+    """Peak resident set size of this process so far (ru_maxrss is in KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(input_file, mapping_file, formats, rounds, workers):
+    """Time one file through parse, mapping and each writer; return a result dict."""
+    from cutoff_writers import WRITERS, XLSX_MAX_ROWS
+    from parse_admission_cutoffs_corrected import (
+        CutoffParser, OUTPUT_COLUMNS, apply_institute_mapping, load_institute_mapping,
+    )
+    from parallel_parse import ParallelCutoffParser
+    from row_store import RowStore
+
+    logging.getLogger("cutoffs").setLevel(logging.CRITICAL)
+    result = {"rss_start_mib": peak_rss_mib()}
+
+    parse_times = []
+    for _ in range(rounds):
+        parser = ParallelCutoffParser(workers) if workers else CutoffParser()
+        store = RowStore()
+        start = time.perf_counter()
+        store.extend(parser.iter_rows(input_file))
+        parse_times.append(time.perf_counter() - start)
+    result["rows"] = len(store)
+    result["stats"] = parser.stats
+    result["parse_seconds"] = min(parse_times)
+    result["parse_seconds_mean"] = sum(parse_times) / len(parse_times)
+    result["rss_parse_mib"] = peak_rss_mib()
+
+    start = time.perf_counter()
+    df = store.to_frame()
+    result["frame_seconds"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    apply_institute_mapping(df, load_institute_mapping(mapping_file))
+    result["mapping_seconds"] = time.perf_counter() - start
+    df['Branch Code'] = df['Branch Code'].cat.rename_categories(lambda code: str(code).zfill(10))
+    df = df[OUTPUT_COLUMNS]
+
+    result["write_seconds"] = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for output_format in formats:
+            writer, extension = WRITERS[output_format]
+            if output_format == "xlsx" and len(df) > XLSX_MAX_ROWS:
+                continue
+            output_file = os.path.join(output_dir, f"bench.{extension}")
+            start = time.perf_counter()
+            try:
+                writer(df, output_file)
+            except ImportError:
+                continue
+            result["write_seconds"][output_format] = time.perf_counter() - start
+    result["rss_peak_mib"] = peak_rss_mib()
+    return result
+
+
+def synthetic_file(work_dir, lines, seed):
+    """Return (text file, mapping CSV, lines, expected rows), generating them if needed."""
+    base = os.path.join(work_dir, f"synthetic_{lines}_{seed}")
+    info_file = base + ".json"
+    if os.path.exists(info_file):
+        with open(info_file) as file:
+            info = json.load(file)
+    else:
+        written, rows = generate(base + ".txt", lines=lines, mapping=base + ".csv", seed=seed)
+        info = {"lines": written, "rows": rows}
+        with open(info_file, "w") as file:
+            json.dump(info, file)
+    return base + ".txt", base + ".csv", info["lines"], info["rows"]
+
+
+def run_size(size, args):
+    """Generate the file for one size and measure it in a child process."""
+    input_file, mapping_file, lines, expected_rows = synthetic_file(args.work_dir, size, args.seed)
+    command = [sys.executable, os.path.abspath(__file__), "--measure", input_file, mapping_file,
+               "--formats", *args.formats, "--rounds", str(args.rounds)]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.splitlines()[-1])
+    result.update(size=size, lines=lines, expected_rows=expected_rows)
+    result["lines_per_second"] = lines / result["parse_seconds"]
+    return result
+
+
+def report(result):
+    writes = "  ".join(f"{name} {seconds:.2f} s" for name, seconds in result["write_seconds"].items())
+    check = "" if result["rows"] == result["expected_rows"] else f"  ROWS {result['rows']} != {result['expected_rows']}"
+    print(f"{result['lines']:>10} lines {result['rows']:>10} rows  "
+          f"parse {result['parse_seconds']:7.2f} s {result['lines_per_second']:>10,.0f} lines/s  "
+          f"RSS {result['rss_parse_mib']:7.1f}/{result['rss_peak_mib']:7.1f} MiB  "
+          f"mapping {result['mapping_seconds']:6.2f} s  {writes}{check}")
+
+
+def compare(results, baseline, tolerance):
+    """Print regressions against a saved run; return True if there were any."""
+    previous = {entry["size"]: entry for entry in baseline}
+    regressed = False
+    for result in results:
+        old = previous.get(result["size"])
+        if old is None:
+            continue
+        if result["lines_per_second"] < old["lines_per_second"] * (1 - tolerance):
+            print(f"REGRESSION {result['size']} lines: parse {old['lines_per_second']:,.0f} -> "
+                  f"{result['lines_per_second']:,.0f} lines/s")
+            regressed = True
+        if result["rss_peak_mib"] > old["rss_peak_mib"] * (1 + tolerance):
+            print(f"REGRESSION {result['size']} lines: peak RSS {old['rss_peak_mib']:.1f} -> "
+                  f"{result['rss_peak_mib']:.1f} MiB")
+            regressed = True
+    return regressed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", nargs="+", default=["10k", "100k", "1M"],
+                            help="Input sizes in lines, e.g. 10k 100k 1M 10M")
+    arg_parser.add_argument("--formats", nargs="+", default=["parquet", "csv"],
+                            choices=["xlsx", "parquet", "csv"], help="Output formats to time")
+    arg_parser.add_argument("--rounds", type=int, default=3, help="Parse runs per size; the best is reported")
+    arg_parser.add_argument("--workers", type=int, default=None, help="Parse with ParallelCutoffParser")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Generator seed")
+    arg_parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "cap_bench"),
+                            help="Where generated inputs are kept between runs")
+    arg_parser.add_argument("--save", default=None, help="Write the results to this JSON file")
+    arg_parser.add_argument("--baseline", default=None, help="Compare against results saved with --save")
+    arg_parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown or RSS growth")
+    arg_parser.add_argument("--measure", nargs=2, metavar=("INPUT", "MAPPING"), help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure, args.formats, args.rounds, args.workers)))
+        return 0
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    results = []
+    for size in map(parse_size, args.sizes):
+        result = run_size(size, args)
+        report(result)
+        results.append(result)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    failed = any(result["rows"] != result["expected_rows"] for result in results)
+    if args.baseline:
+        with open(args.baseline) as file:
+            failed = compare(results, json.load(file), args.tolerance) or failed
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
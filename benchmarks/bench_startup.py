@@ -0,0 +1,104 @@
+"""Measure the import time of the tool modules and guard their lazy imports.
+
+    python benchmarks/bench_startup.py --save startup.json
+    python benchmarks/bench_startup.py --baseline startup.json
+
+Each module is imported in a fresh interpreter under `python -X importtime`
+and the self times of everything it pulled in are summed, best of --rounds.
+The fast-path modules (scanning a file for institute headers, checking a
+file) must not import pandas, numpy or openpyxl; the exit status is 1 if one
+does, or if with --baseline an import got slower by more than --tolerance.
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Modules timed, and whether each must stay free of the heavy packages
+MODULES = {
+    "cutoff_reader": True,
+    "row_store": True,
+    "cutoff_writers": True,
+    "institute_mapping": True,
+    "parse_admission_cutoffs_corrected": True,
+    "extract_missing_institutes": True,
+    "cet_cutoffs": True,
+    "watch_folder": True,
+    "cutoff_index": False,
+}
+
+HEAVY_PACKAGES = ("pandas", "numpy", "openpyxl", "pyarrow")
+
+
+def import_times(module):
+    """Import module in a fresh interpreter; return (total self microseconds, top-level packages imported)."""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True)
+    total = 0
+    packages = set()
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        total += int(self_us)
+        packages.add(name.strip().split(".")[0])
+    return total, packages
+
+
+def measure(module, rounds):
+    best = None
+    for _ in range(rounds):
+        total, packages = import_times(module)
+        best = total if best is None else min(best, total)
+    heavy = sorted(packages.intersection(HEAVY_PACKAGES))
+    return {"module": module, "import_ms": best / 1000, "heavy_imports": heavy, "fast_path": MODULES[module]}
+
+
+def compare(results, baseline, tolerance):
+    """Print regressions against a saved run; return True if there were any."""
+    previous = {entry["module"]: entry for entry in baseline}
+    regressed = False
+    for result in results:
+        old = previous.get(result["module"])
+        if old is not None and result["import_ms"] > old["import_ms"] * (1 + tolerance):
+            print(f"REGRESSION {result['module']}: import {old['import_ms']:.1f} -> {result['import_ms']:.1f} ms")
+            regressed = True
+    return regressed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--modules", nargs="+", default=list(MODULES), choices=list(MODULES),
+                            help="Modules to import")
+    arg_parser.add_argument("--rounds", type=int, default=5, help="Imports per module; the fastest is reported")
+    arg_parser.add_argument("--save", default=None, help="Write the results to this JSON file")
+    arg_parser.add_argument("--baseline", default=None, help="Compare against results saved with --save")
+    arg_parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed import slowdown")
+    args = arg_parser.parse_args()
+
+    results = []
+    failed = False
+    for module in args.modules:
+        result = measure(module, args.rounds)
+        heavy = ", ".join(result["heavy_imports"]) or "-"
+        print(f"{module:<36} {result['import_ms']:8.1f} ms  heavy imports: {heavy}")
+        if result["fast_path"] and result["heavy_imports"]:
+            print(f"FAIL {module} imports {heavy} at startup")
+            failed = True
+        results.append(result)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            failed = compare(results, json.load(file), args.tolerance) or failed
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,204 @@
+"""Generate synthetic CAP cutoff text in the layout of the PDF text dumps.
+
+    python benchmarks/synthetic_cap.py synthetic.txt --lines 1000000 --mapping synthetic_mapping.csv
+
+Institutes hold branches and each branch holds one stage table per seat
+description: a Stage header, its category columns, then one rank slot per
+category for every stage row. The production layout quirks are mixed in:
+blank slots for skipped categories, ranks split from their score
+("7574" then "(97.4656463)"), in stage rows and overflow fragments alike,
+I-Non rows with a Defence/PWD qualifier, MH rows with their single MI rank
+closing a table, concatenated runs with the line breaks lost, and trailing
+category columns that overflow onto the next page. Stage rows come in the
+order of the dumps (I, II, I-Non, III ... VII) and percentiles fall as
+ranks rise, staying within 0-100, so cutoff_validation.py finds nothing to
+report. Header lines end in \\r\\n and table lines in a bare \\r, as in
+the dumps. The output is the same for the same --seed.
+"""
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from parse_admission_cutoffs_corrected import CATEGORY_COLUMNS, SEAT_DESCRIPTIONS, STANDALONE_CATEGORIES
+
+DISTRICTS = ["Amravati", "Pune", "Mumbai", "Nagpur", "Nashik", "Aurangabad", "Kolhapur", "Solapur"]
+BRANCH_NAMES = [
+    "Civil Engineering", "Computer Science and Engineering", "Information Technology",
+    "Mechanical Engineering", "Electrical Engineering", "Electronics and Telecommunication Engg",
+    "Chemical Engineering", "Artificial Intelligence and Data Science",
+]
+STATUSES = ["Government Autonomous", "Un-Aided Autonomous", "Un-Aided", "Government-Aided"]
+# Stage rows after I, in the order they appear in a table
+LATER_STAGES = ["II", "I-Non Defence", "I-Non PWD", "III", "IV", "V", "VI", "VII"]
+# H/O/S column suffix for each seat description
+SEAT_SUFFIXES = {seat: suffix for seat, suffix in zip(SEAT_DESCRIPTIONS, "SHOO")}
+# The MI column only appears under the MH stage, which has its own layout
+TABLE_COLUMNS = CATEGORY_COLUMNS[:-1]
+
+
+class SyntheticCapWriter:
+    """Write synthetic CAP text and count the rows a correct parse should give.
+
+    blank, split, concatenated, overflow and mh are the probabilities of a
+    blank slot, a split rank/score, a stage row written as one concatenated
+    line, a table whose standalone columns overflow to a fragment after it
+    and a table closed by an MH row.
+    """
+
+    def __init__(self, file, seed=0, branches=6, seat_descriptions=2, stages=4, categories=20,
+                 blank=0.3, split=0.02, concatenated=0.05, overflow=0.05, mh=0.1):
+        self.file = file
+        self.random = random.Random(seed)
+        self.branches = branches
+        self.seat_descriptions = seat_descriptions
+        self.stages = stages
+        self.categories = categories
+        self.blank = blank
+        self.split = split
+        self.concatenated = concatenated
+        self.overflow = overflow
+        self.mh = mh
+        self.lines = 0
+        self.rows = 0
+        self.institute_codes = []
+
+    def _write(self, lines, ending):
+        self.file.write("".join(line + ending for line in lines))
+        self.lines += len(lines)
+
+    def _slot(self, blank=True):
+        """Return the lines of one rank slot: a rank, a split rank or None for a blank."""
+        if blank and self.random.random() < self.blank:
+            return None
+        rank = self.random.randint(1, 200000)
+        score = f"{min(100.0, max(0.0, 100 - rank / 2000 + self.random.random())):.7f}"
+        if self.random.random() < self.split:
+            return [str(rank), f"({score})"]
+        return [f"{rank} ({score})"]
+
+    def _stage_rows(self, stage, width):
+        """Return the lines of one stage row of width slots."""
+        self.rows += width
+        if stage.startswith("I-Non "):
+            lines = ["  I-Non ", stage[6:]]
+        else:
+            lines = [f"  {stage}"]
+        if self.random.random() < self.concatenated:
+            # Blank slots vanish when lines are glued, so glued rows have none
+            lines[-1] += "".join("".join(self._slot(blank=False)) for _ in range(width))
+            return lines
+        slots = [self._slot() for _ in range(width)]
+        for slot in slots:
+            lines.extend(slot or [""])
+        return lines
+
+    def _table(self, seat, stages):
+        """Return the lines of one stage table, and its overflow fragment lines if any."""
+        suffix = SEAT_SUFFIXES[seat]
+        count = self.random.randint(max(1, self.categories // 2), self.categories)
+        columns = sorted(self.random.sample(range(len(TABLE_COLUMNS)), min(count, len(TABLE_COLUMNS))))
+        categories = [
+            TABLE_COLUMNS[column] if TABLE_COLUMNS[column] in STANDALONE_CATEGORIES else TABLE_COLUMNS[column] + suffix
+            for column in columns
+        ]
+        spilled = [category for category in categories if category in STANDALONE_CATEGORIES]
+        if not spilled or len(spilled) == len(categories) or self.random.random() >= self.overflow:
+            spilled = []
+        kept = categories[:len(categories) - len(spilled)]
+
+        if self.random.random() < self.concatenated:
+            lines = ["Stage" + "".join(kept)]
+        else:
+            lines = ["Stage"] + kept
+        for stage in stages:
+            lines.extend(self._stage_rows(stage, len(kept)))
+        # The MH row has the MI column alone and is not continued by overflow columns
+        if self.random.random() < self.mh:
+            lines.extend(self._stage_rows("MH", 1))
+        fragment = []
+        if spilled:
+            fragment = spilled[:]
+            for _ in stages:
+                for _ in spilled:
+                    fragment.extend(self._slot() or [""])
+            self.rows += len(stages) * len(spilled)
+        return lines, fragment
+
+    def write_institute(self, code):
+        """Write one institute block with its branches."""
+        district = self.random.choice(DISTRICTS)
+        self._write([f"{code:05d} - Synthetic Institute of Engineering {code}, {district}"], "\r\n")
+        self.institute_codes.append((code, district))
+        for number in range(self.branches):
+            self._write([f"{code:05d}{number * 7 % 1000:03d}10 - {BRANCH_NAMES[number % len(BRANCH_NAMES)]}",
+                         f"Status:\t{self.random.choice(STATUSES)}"], "\r\n")
+            for seat in SEAT_DESCRIPTIONS[:self.seat_descriptions]:
+                stages = ["I"] + LATER_STAGES[:max(0, self.stages - 1)]
+                self._write([seat], "\r\n")
+                lines, fragment = self._table(seat, stages)
+                self._write(lines, "\r")
+                if fragment:
+                    self._write([""], "\r\n")
+                    self._write(fragment, "\r")
+                self._write([""], "\r\n")
+
+    def write(self, lines=None, institutes=None):
+        """Write institutes until there are at least lines lines, or institutes institutes."""
+        code = 1001
+        while (lines is not None and self.lines < lines) or (institutes is not None and code - 1001 < institutes):
+            self.write_institute(code)
+            code += 1
+
+
+def write_mapping(path, institute_codes):
+    """Write a mapping CSV for the generated institutes, like institute_code_names_mapping_r2.csv."""
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        file.write("Institute Code,Institute Name\n")
+        for code, district in institute_codes:
+            file.write(f'{code},"Synthetic Institute of Engineering {code}, {district}"\n')
+
+
+def generate(path, lines=None, institutes=None, mapping=None, **options):
+    """Write a synthetic cutoff file; return (lines written, expected rows)."""
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = SyntheticCapWriter(file, **options)
+        writer.write(lines, institutes)
+    if mapping:
+        write_mapping(mapping, writer.institute_codes)
+    return writer.lines, writer.rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("output", help="Text file to write")
+    size = arg_parser.add_mutually_exclusive_group()
+    size.add_argument("--lines", type=int, default=None, help="Write institutes until at least this many lines")
+    size.add_argument("--institutes", type=int, default=None, help="Number of institutes to write")
+    arg_parser.add_argument("--branches", type=int, default=6, help="Branches per institute")
+    arg_parser.add_argument("--seat-descriptions", type=int, default=2, choices=range(1, len(SEAT_DESCRIPTIONS) + 1),
+                            help="Stage tables per branch")
+    arg_parser.add_argument("--stages", type=int, default=4, choices=range(1, len(LATER_STAGES) + 2),
+                            help="Stage rows per table")
+    arg_parser.add_argument("--categories", type=int, default=20, help="Most category columns per table")
+    arg_parser.add_argument("--blank", type=float, default=0.3, help="Share of blank rank slots")
+    arg_parser.add_argument("--split", type=float, default=0.02, help="Share of ranks split from their score")
+    arg_parser.add_argument("--concatenated", type=float, default=0.05, help="Share of stage rows glued into one line")
+    arg_parser.add_argument("--overflow", type=float, default=0.05, help="Share of tables with overflow columns")
+    arg_parser.add_argument("--mh", type=float, default=0.1, help="Share of tables closed by an MH row")
+    arg_parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    arg_parser.add_argument("--mapping", default=None, help="Also write a mapping CSV for the institutes")
+    args = arg_parser.parse_args()
+
+    lines, rows = generate(
+        args.output, args.lines, args.institutes if args.lines is None else None, args.mapping,
+        seed=args.seed, branches=args.branches, seat_descriptions=args.seat_descriptions, stages=args.stages,
+        categories=args.categories, blank=args.blank, split=args.split, concatenated=args.concatenated,
+        overflow=args.overflow, mh=args.mh)
+    print(f"Wrote {lines} lines to {args.output}; a correct parse gives {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import pickle
+import hashlib
+
+from cutoff_reader import MappedTextFile, count_lines
+from cutoff_writers import atomic_path
+from parse_admission_cutoffs_corrected import CutoffParser, PARSER_VERSION, logger
+from row_store import RowStore
+
+
+def split_blocks(text_file):
+    """Return (start, end) byte ranges of the institute blocks of a mapped file.
+
+    The first range holds any text before the first institute header.
+    """
+    size = len(text_file)
+    starts = [0] + [offset for offset in text_file.institute_offsets() if offset]
+    return [(start, end) for start, end in zip(starts, starts[1:] + [size]) if end > start]
+
+
+def block_label(data):
+    """Name a block by its institute header line, e.g. "01002 - Government ..."."""
+    lines = data[:512].splitlines()
+    if not lines or not lines[0][:5].isdigit():
+        return "(before first institute)"
+    return lines[0].decode("utf-8", "replace")
+
+
+class CachedCutoffParser:
+    """Parse a cutoff file, reusing the rows of institute blocks parsed before.
+
+    Each block's rows, stats and institutes are stored in cache_dir under a hash of the
+    block's raw bytes and PARSER_VERSION, so a re-run only parses blocks whose
+    text changed. Parser state is reset at every institute header, which makes
+    the result the same as a single CutoffParser run. Offsets are stored
+    relative to the block, so a block that moved in the file is still reused.
+    Line-level log messages are only written for blocks that are re-parsed.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.stats = CutoffParser().stats
+        self.institutes = {}
+        self.reparsed = []  # Labels of the blocks parsed in the last run
+        self.reused = 0
+
+    def _cache_file(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def _load(self, key):
+        try:
+            with open(self._cache_file(key), "rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError, ValueError) as e:
+            logger.warning("Ignoring unreadable cache entry %s: %s", key, e)
+            return None
+
+    def _save(self, key, entry):
+        cache_file = self._cache_file(key)
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        # Write to a temporary file first so an interrupted run leaves no partial entry
+        with atomic_path(cache_file) as temp_name, open(temp_name, "wb") as file:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def iter_rows(self, path):
+        """Yield parsed rows from the file at path, in document order."""
+        self.reparsed = []
+        self.reused = 0
+        version = PARSER_VERSION.encode()
+        with MappedTextFile(path) as text_file:
+            first_line = 1
+            for start, end in split_blocks(text_file):
+                data = text_file.read(start, end)
+                key = hashlib.sha256(version + b"\0" + data).hexdigest()
+                entry = self._load(key)
+                if entry is None:
+                    self.reparsed.append(block_label(data))
+                    parser = CutoffParser()
+                    store = RowStore()
+                    for row in parser.parse_lines(text_file.iter_lines(start, end), first_line):
+                        store.append(row._replace(source_offset=row.source_offset - start))
+                        yield row
+                    self._save(key, (store, parser.stats, parser.institutes))
+                    stats = parser.stats
+                    institutes = parser.institutes
+                else:
+                    self.reused += 1
+                    store, stats, institutes = entry
+                    yield from store.iter_rows(offset_shift=start)
+                for name, value in stats.items():
+                    self.stats[name] += value
+                for code, name in institutes.items():
+                    self.institutes.setdefault(code, name)
+                first_line += count_lines(data)
+
+        logger.info("Block cache: %s institute blocks reused, %s re-parsed", self.reused, len(self.reparsed))
+        for label in self.reparsed:
+            logger.info("Re-parsed: %s", label)
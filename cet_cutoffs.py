@@ -0,0 +1,292 @@
+"""cet-cutoffs: parse a batch of CAP cutoff round files in one run.
+
+    python cet_cutoffs.py documents/ "dumps/2023ENGG_CAP*.txt" --format parquet --jobs 4
+
+Each input is a text or PDF file, a directory of .txt and .pdf files or a
+glob. The mapping CSV is loaded once and shared by every file. Each file
+gets its own output and extraction log, and all rows are also written to one
+combined dataset tagged with the year and CAP round taken from the file
+name. With --db every round is also loaded into a SQLite database, and
+with --quarantine institute blocks that fail to parse are set aside in
+<name>_quarantine.txt while the rest of each file is kept.
+
+    python cet_cutoffs.py query combined_cutoffs_output.parquet --category GOPENS --stage I --max-rank 20000
+
+The query subcommand answers rank-range and branch or district lookups
+from an output file through the sorted index in cutoff_index.py, and the
+diff subcommand compares two rounds with round_diff.py.
+
+    python cet_cutoffs.py check documents/
+
+The check subcommand parses each file without building frames or loading
+pandas and exits with status 1 if any file has unhandled lines, malformed
+or out-of-range ranks, or overflow fragments that could not be placed.
+
+    python cet_cutoffs.py watch documents/ --output-dir outputs --jobs 4
+
+The watch subcommand keeps running and parses round files as they arrive in
+or change in a directory, with the workers and the mapping kept loaded (see
+watch_folder.py).
+"""
+import os
+import re
+import sys
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from cutoff_writers import WRITERS, XLSX_MAX_ROWS, write_output
+from parse_admission_cutoffs_corrected import (
+    CutoffParser, configure_logging, load_institute_mapping, logger, mapping_csv, process_file,
+)
+
+# Parser counters that make a file fail the check subcommand
+CHECK_FAILURES = ("unhandled_lines", "malformed_ranks", "out_of_range_ranks", "overflow_fragments_unplaced")
+
+# Text files the parser writes next to its outputs, never round files
+IGNORED_SUFFIXES = ("_extraction_log.txt", "_quarantine.txt")
+
+# Year and CAP round in names like 2024ENGG_CAP2_CutOff_cropped.txt
+round_file_pattern = re.compile(r"(\d{4})ENGG_CAP(\d+)", re.IGNORECASE)
+
+
+def round_tag(path):
+    """Return (year, round) from a round file name, e.g. (2024, "CAP2"), or (None, None)."""
+    match = round_file_pattern.search(os.path.basename(path))
+    if not match:
+        return None, None
+    return int(match.group(1)), f"CAP{match.group(2)}"
+
+
+def is_round_file(name):
+    """Return True for .txt and .pdf names that are not hidden or written by the parser itself."""
+    return (name.lower().endswith((".txt", ".pdf")) and not name.startswith(".")
+            and not name.endswith(IGNORED_SUFFIXES))
+
+
+def find_round_files(inputs):
+    """Expand files, directories and glob patterns into a de-duplicated list of round files.
+
+    Directories and patterns skip the extraction logs and quarantine files
+    the parser writes, so an input directory can also be the output
+    directory. Files named explicitly are always kept.
+    """
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "*.txt")) + glob.glob(os.path.join(item, "*.pdf"))
+        elif glob.has_magic(item):
+            matches = glob.glob(item)
+        else:
+            paths.append(item)
+            continue
+        paths.extend(sorted(path for path in matches if is_round_file(os.path.basename(path))))
+    return list(dict.fromkeys(paths))
+
+
+def shared_output_names(paths):
+    """Return {base name: paths} for inputs that would write the same output and log files."""
+    by_name = {}
+    for path in paths:
+        by_name.setdefault(os.path.splitext(os.path.basename(path))[0], []).append(path)
+    return {name: group for name, group in by_name.items() if len(group) > 1}
+
+
+def combine_rounds(frames):
+    """Concatenate per-file frames, keeping shared columns categorical."""
+    import pandas as pd
+    from pandas.api.types import union_categoricals
+
+    frames = [frame.copy() for frame in frames]
+    for column in frames[0].select_dtypes("category").columns:
+        if all(isinstance(frame[column].dtype, pd.CategoricalDtype) for frame in frames):
+            categories = union_categoricals([frame[column] for frame in frames]).categories
+            for frame in frames:
+                frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def check_file(path):
+    """Parse a round file without keeping its rows and return the parser counters."""
+    if path.lower().endswith(".pdf"):
+        from pdf_ingest import PdfCutoffParser
+        parser = PdfCutoffParser()
+    else:
+        parser = CutoffParser()
+    for _ in parser.iter_rows(path):
+        pass
+    return parser.stats
+
+
+def check_main(argv):
+    arg_parser = argparse.ArgumentParser(prog="cet-cutoffs check",
+                                         description="Parse round files and report lines the parser could not use.")
+    arg_parser.add_argument("inputs", nargs="+", help="Round text or PDF files, directories or glob patterns")
+    arg_parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                            help="Lowest level of parser events printed while checking")
+    args = arg_parser.parse_args(argv)
+
+    logger.setLevel(args.log_level)
+    paths = find_round_files(args.inputs)
+    if not paths:
+        arg_parser.error("no input files found")
+    failed = 0
+    for path in paths:
+        try:
+            stats = check_file(path)
+        except OSError as e:
+            print(f"{path}: {e}")
+            failed += 1
+            continue
+        problems = {name: stats[name] for name in CHECK_FAILURES if stats[name]}
+        print(f"{path}: {stats['institutes_processed']} institutes, {stats['branches_processed']} branches, "
+              f"{stats['total_rows']} rows" + "".join(f", {count} {name.replace('_', ' ')}"
+                                                      for name, count in problems.items()))
+        failed += bool(problems)
+    return 1 if failed else 0
+
+
+# The mapping loaded once in the parent, handed to each worker at start-up
+_worker_mapping = None
+
+
+def _init_worker(institute_mapping, log_level):
+    global _worker_mapping
+    _worker_mapping = institute_mapping
+    logger.setLevel(log_level)
+
+
+def _process_in_worker(path, output_format, output_dir, cache_dir, quarantine, validate):
+    # The jobs already spread files over the cores; a PDF is extracted in this process
+    workers = 1 if path.lower().endswith(".pdf") else None
+    return process_file(path, _worker_mapping, output_format, output_dir, workers=workers, cache_dir=cache_dir,
+                        quarantine=quarantine, validate=validate)
+
+
+def process_files(paths, institute_mapping, output_format="xlsx", output_dir=".", jobs=1, cache_dir=None,
+                  quarantine=False, validate=False):
+    """Yield (path, frame) for each file in order; frame is None for files that failed."""
+    if jobs <= 1:
+        for path in paths:
+            yield path, process_file(path, institute_mapping, output_format, output_dir, cache_dir=cache_dir,
+                                     quarantine=quarantine, validate=validate)
+        return
+    with ProcessPoolExecutor(jobs, initializer=_init_worker,
+                             initargs=(institute_mapping, logger.getEffectiveLevel())) as pool:
+        futures = [pool.submit(_process_in_worker, path, output_format, output_dir, cache_dir, quarantine, validate)
+                   for path in paths]
+        for path, future in zip(paths, futures):
+            yield path, future.result()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["query"]:
+        from cutoff_index import main as query_main
+        return query_main(argv[1:])
+    if argv[:1] == ["diff"]:
+        from round_diff import main as diff_main
+        return diff_main(argv[1:])
+    if argv[:1] == ["check"]:
+        return check_main(argv[1:])
+    if argv[:1] == ["watch"]:
+        from watch_folder import main as watch_main
+        return watch_main(argv[1:])
+
+    arg_parser = argparse.ArgumentParser(prog="cet-cutoffs", description="Parse a batch of CAP cutoff round files.")
+    arg_parser.add_argument("inputs", nargs="+", help="Round text or PDF files, directories or glob patterns")
+    arg_parser.add_argument("--mapping", default=mapping_csv, help="Institute code/name mapping CSV")
+    arg_parser.add_argument("--format", dest="output_format", default="xlsx", choices=sorted(WRITERS),
+                            help="Output file format")
+    arg_parser.add_argument("--output-dir", default=".", help="Directory for per-file and combined outputs")
+    arg_parser.add_argument("--jobs", type=int, default=1, help="Process this many files at once")
+    arg_parser.add_argument("--combined-name", default="combined",
+                            help="Base name of the combined dataset (<name>_cutoffs_output.<ext>)")
+    arg_parser.add_argument("--cache-dir", default=None,
+                            help="Reuse parsed institute blocks from this directory across runs")
+    arg_parser.add_argument("--quarantine", action="store_true",
+                            help="Set failing institute blocks of text inputs aside in <name>_quarantine.txt "
+                                 "and keep the rest")
+    arg_parser.add_argument("--validate", action="store_true",
+                            help="Write the structural issues of each file to <name>_validation.<ext>")
+    arg_parser.add_argument("--db", default=None,
+                            help="Also load every round into this SQLite database, replacing its load from an "
+                                 "earlier run")
+    arg_parser.add_argument("--index", action="store_true",
+                            help="Build the query index of the combined dataset after writing it")
+    arg_parser.add_argument("--log-level", default="INFO",
+                            choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                            help="Lowest level written to the extraction logs")
+    args = arg_parser.parse_args(argv)
+    if args.quarantine and args.cache_dir:
+        arg_parser.error("--quarantine parses every block afresh and cannot be combined with --cache-dir")
+
+    import pandas as pd
+
+    logger.setLevel(args.log_level)
+    paths = find_round_files(args.inputs)
+    if not paths:
+        arg_parser.error("no input files found")
+    clashes = shared_output_names(paths)
+    if clashes:
+        arg_parser.error("inputs would overwrite each other's outputs: " + "; ".join(
+            f"{name} from {', '.join(group)}" for name, group in clashes.items()))
+    os.makedirs(args.output_dir, exist_ok=True)
+    institute_mapping = load_institute_mapping(args.mapping)
+
+    connection = None
+    if args.db:
+        import cutoff_db
+        connection = cutoff_db.connect(args.db)
+        if institute_mapping is not None:
+            with connection:
+                cutoff_db.load_institutes(connection, institute_mapping)
+
+    frames = []
+    failed = []
+    loaded_rounds = set()
+    for path, df in process_files(paths, institute_mapping, args.output_format, args.output_dir,
+                                    args.jobs, args.cache_dir, args.quarantine, args.validate):
+        if df is None:
+            failed.append(path)
+            continue
+        year, cap_round = round_tag(path)
+        df.insert(0, "Round", cap_round)
+        df.insert(0, "Year", pd.array([year] * len(df), dtype="Int16"))
+        df.insert(2, "Source File", pd.Categorical([os.path.basename(path)] * len(df)))
+        frames.append(df)
+        if connection is not None:
+            # The parts of one round, such as _cropped_1 and _cropped_2, replace its earlier load together
+            round_label = cutoff_db.round_name(year, cap_round, path)
+            cutoff_db.load_frame(connection, df, round_label, year, cap_round, replace=round_label not in loaded_rounds)
+            loaded_rounds.add(round_label)
+    if connection is not None:
+        connection.close()
+
+    if frames:
+        combined_format = args.output_format
+        combined_rows = sum(len(df) for df in frames)
+        if combined_format == "xlsx" and combined_rows > XLSX_MAX_ROWS:
+            logger.warning("The combined dataset has %s rows, more than an xlsx sheet holds; writing it as parquet",
+                           combined_rows)
+            combined_format = "parquet"
+        combined_file = write_output(combine_rounds(frames), args.combined_name, combined_format,
+                                     args.output_dir)
+        if args.index:
+            from cutoff_index import CutoffIndex
+            CutoffIndex.open(combined_file, rebuild=True)
+    logger.info("Processed %s of %s files", len(frames), len(paths))
+    for path in failed:
+        logger.error("Failed to process %s; see its extraction log", path)
+    if args.quarantine:
+        for path in paths:
+            quarantine_file = os.path.join(args.output_dir,
+                                           f"{os.path.splitext(os.path.basename(path))[0]}_quarantine.txt")
+            if os.path.exists(quarantine_file):
+                logger.warning("Blocks of %s were quarantined to %s", path, quarantine_file)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    configure_logging()
+    raise SystemExit(main())
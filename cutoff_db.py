@@ -0,0 +1,224 @@
+"""Load parsed cutoffs into an embedded SQLite database.
+
+    python cutoff_db.py cutoffs.sqlite 2024ENGG_CAP2_cutoffs_output.parquet --mapping documents/institute_code_names_mapping_r2.csv
+    python cet_cutoffs.py documents/ --format parquet --db cutoffs.sqlite
+
+Institutes, branches, seat descriptions, categories and rounds are kept in
+dimension tables and the cutoffs table refers to them by id. Loading a
+round again in a later run replaces all of its rows, so seats that are gone
+from a re-parsed round are dropped too; the files of one round loaded in the
+same run, such as the parts of a cropped dump, are all kept. Rows are
+upserted on (round, branch code, seat description, stage, category) and the
+last of any duplicates wins.
+"""
+import os
+import time
+import sqlite3
+import logging
+import argparse
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from cutoff_writers import read_output
+
+logger = logging.getLogger("cutoffs")
+
+# Fact rows per executemany call; each load is still one transaction
+BATCH_ROWS = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS institutes (
+    institute_code TEXT PRIMARY KEY,
+    institute_name TEXT NOT NULL,
+    district TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS branches (
+    branch_id INTEGER PRIMARY KEY,
+    branch_code TEXT NOT NULL UNIQUE,
+    branch_name TEXT NOT NULL,
+    institute_code TEXT REFERENCES institutes (institute_code),
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seat_descriptions (
+    seat_id INTEGER PRIMARY KEY,
+    seat_description TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS categories (
+    category_id INTEGER PRIMARY KEY,
+    category TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS rounds (
+    round_id INTEGER PRIMARY KEY,
+    round TEXT NOT NULL UNIQUE,
+    year INTEGER,
+    cap_round TEXT
+);
+CREATE TABLE IF NOT EXISTS cutoffs (
+    round_id INTEGER NOT NULL REFERENCES rounds (round_id),
+    branch_id INTEGER NOT NULL REFERENCES branches (branch_id),
+    seat_id INTEGER NOT NULL REFERENCES seat_descriptions (seat_id),
+    stage TEXT NOT NULL,
+    category_id INTEGER NOT NULL REFERENCES categories (category_id),
+    rank INTEGER,
+    percentile REAL,
+    PRIMARY KEY (round_id, branch_id, seat_id, stage, category_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cutoffs_by_rank ON cutoffs (category_id, stage, rank);
+CREATE INDEX IF NOT EXISTS cutoffs_by_branch ON cutoffs (branch_id, round_id);
+"""
+
+UPSERT_CUTOFF = """
+INSERT INTO cutoffs (round_id, branch_id, seat_id, stage, category_id, rank, percentile)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (round_id, branch_id, seat_id, stage, category_id)
+DO UPDATE SET rank = excluded.rank, percentile = excluded.percentile
+"""
+
+
+def connect(db_path):
+    """Open the database, creating the schema if needed."""
+    connection = sqlite3.connect(db_path)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    # Room for the fact table indexes of a full round, so upserts rarely touch disk
+    connection.execute("PRAGMA cache_size = -65536")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def round_name(year, cap_round, source):
+    """Name a round "2024 CAP2", or by its source file name when the year and round are unknown."""
+    if year is None or cap_round is None:
+        return os.path.splitext(os.path.basename(source))[0]
+    return f"{year} {cap_round}"
+
+
+def load_institutes(connection, institute_mapping):
+    """Upsert every institute of a compiled InstituteMapping, with its district, into the institutes table."""
+    connection.executemany(
+        "INSERT INTO institutes (institute_code, institute_name, district) VALUES (?, ?, ?)"
+        " ON CONFLICT (institute_code) DO UPDATE"
+        " SET institute_name = excluded.institute_name, district = excluded.district",
+        institute_mapping.rows())
+    return len(institute_mapping)
+
+
+def _dimension_ids(connection, table, column, id_column, values):
+    """Insert any new values into a one-column dimension table and return {value: id}."""
+    connection.executemany(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", ((value,) for value in values))
+    ids = {}
+    for start in range(0, len(values), 500):
+        chunk = values[start:start + 500]
+        ids.update(connection.execute(
+            f"SELECT {column}, {id_column} FROM {table} WHERE {column} IN ({','.join('?' * len(chunk))})", chunk))
+    return ids
+
+
+def _codes(column, ids):
+    """Map a text column to dimension ids through its categories, once per distinct value."""
+    column = column.astype("category")
+    lookup = np.array([ids[value] for value in column.cat.categories], dtype=np.int64)
+    return lookup[column.cat.codes.to_numpy()]
+
+
+def load_frame(connection, df, round_label, year=None, cap_round=None, replace=True):
+    """Load a parsed output frame as the rows of one round, in a single transaction.
+
+    With replace the round's earlier rows are deleted first; a run that
+    loads several files of one round replaces only on the first. Branches
+    take the institute code, name and status of their rows; the institute
+    must already be in the institutes table for the code to be kept.
+    Returns the number of rows written.
+    """
+    start_time = time.perf_counter()
+    df = df.dropna(subset=['Branch Code', 'Stage', 'Category'])
+    with connection:
+        connection.execute(
+            "INSERT INTO rounds (round, year, cap_round) VALUES (?, ?, ?)"
+            " ON CONFLICT (round) DO UPDATE SET year = excluded.year, cap_round = excluded.cap_round",
+            (round_label, year, cap_round))
+        round_id = connection.execute("SELECT round_id FROM rounds WHERE round = ?", (round_label,)).fetchone()[0]
+        if replace:
+            # The primary key starts with round_id, so this is a range delete; it commits or rolls back with the load
+            connection.execute("DELETE FROM cutoffs WHERE round_id = ?", (round_id,))
+
+        # A CSV output reads a blank status back as missing; store it as empty text, since astype(str)
+        # would keep it as NaN on pandas 3 and write "nan" on pandas 2
+        branches = df[['Branch Code', 'Branch Name', 'Institute Code', 'Status']].astype("string").fillna("")
+        branches = branches.drop_duplicates('Branch Code', keep='last')
+        connection.executemany(
+            "INSERT INTO branches (branch_code, branch_name, institute_code, status)"
+            " VALUES (?, ?, (SELECT institute_code FROM institutes WHERE institute_code = ?), ?)"
+            " ON CONFLICT (branch_code) DO UPDATE SET branch_name = excluded.branch_name,"
+            " institute_code = coalesce(excluded.institute_code, branches.institute_code), status = excluded.status",
+            branches.itertuples(index=False, name=None))
+        branch_ids = dict(connection.execute("SELECT branch_code, branch_id FROM branches"))
+        seat_ids = _dimension_ids(connection, "seat_descriptions", "seat_description", "seat_id",
+                                  df['Seat Description'].astype(str).unique().tolist())
+        category_ids = _dimension_ids(connection, "categories", "category", "category_id",
+                                      df['Category'].astype(str).unique().tolist())
+
+        branch_column = _codes(df['Branch Code'].astype(str), branch_ids).tolist()
+        seat_column = _codes(df['Seat Description'].astype(str), seat_ids).tolist()
+        category_column = _codes(df['Category'].astype(str), category_ids).tolist()
+        stage_column = df['Stage'].astype(str).tolist()
+        ranks = pd.to_numeric(df['Rank']).astype("Int64")
+        rank_column = ranks.astype(object).where(ranks.notna(), None).tolist()
+        percentiles = pd.to_numeric(df['Percentile']).astype(object)
+        percentile_column = percentiles.where(percentiles.notna(), None).tolist()
+
+        rows = zip([round_id] * len(df), branch_column, seat_column, stage_column, category_column,
+                   rank_column, percentile_column)
+        while True:
+            batch = list(islice(rows, BATCH_ROWS))
+            if not batch:
+                break
+            connection.executemany(UPSERT_CUTOFF, batch)
+    logger.info("Loaded %s rows for round %s in %.2f s", len(df), round_label, time.perf_counter() - start_time)
+    return len(df)
+
+
+def load_output_file(connection, output_file, round_label=None, replace=True):
+    """Load one output file as a round, naming it from the file name unless round_label is given."""
+    from cet_cutoffs import round_tag
+
+    year, cap_round = round_tag(output_file)
+    round_label = round_label or round_name(year, cap_round, output_file)
+    return load_frame(connection, read_output(output_file), round_label, year, cap_round, replace)
+
+
+def main(argv=None):
+    from cet_cutoffs import round_tag
+    from parse_admission_cutoffs_corrected import load_institute_mapping, mapping_csv
+
+    arg_parser = argparse.ArgumentParser(description="Load parsed cutoff output files into a SQLite database.")
+    arg_parser.add_argument("db", help="SQLite database file, created if missing")
+    arg_parser.add_argument("outputs", nargs="+", help="Output files written by the parser, one round each")
+    arg_parser.add_argument("--mapping", default=mapping_csv, help="Institute code/name mapping CSV")
+    arg_parser.add_argument("--round", dest="round_label", default=None,
+                            help="Round name, when loading a single file whose name has no year and CAP round")
+    args = arg_parser.parse_args(argv)
+    if args.round_label and len(args.outputs) > 1:
+        arg_parser.error("--round needs a single output file")
+
+    connection = connect(args.db)
+    try:
+        institute_mapping = load_institute_mapping(args.mapping)
+        if institute_mapping is not None:
+            with connection:
+                load_institutes(connection, institute_mapping)
+        loaded_rounds = set()
+        for output_file in args.outputs:
+            round_label = args.round_label or round_name(*round_tag(output_file), output_file)
+            load_output_file(connection, output_file, round_label, replace=round_label not in loaded_rounds)
+            loaded_rounds.add(round_label)
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    raise SystemExit(main())
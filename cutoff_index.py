@@ -0,0 +1,205 @@
+"""Query parsed cutoff outputs through sorted indexes.
+
+    python cutoff_index.py combined_cutoffs_output.parquet --category GOPENS --stage I --max-rank 20000 --district Pune
+    python cet_cutoffs.py query combined_cutoffs_output.parquet --branch 0100224210
+
+Rows are sorted once by (Category, Stage, Rank), by Branch Code and by
+District, and queries are answered with binary searches over those orders.
+The index is saved next to the output file as <output>.index.pkl and is
+rebuilt only when the output file changes.
+"""
+import os
+import time
+import pickle
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from cutoff_writers import atomic_path, read_output
+
+logger = logging.getLogger("cutoffs")
+
+# Bump when the saved index layout changes; older index files are rebuilt
+INDEX_VERSION = "1"
+
+# Columns looked up by exact value, with a sorted order each
+POINT_COLUMNS = ["Branch Code", "District"]
+
+
+def index_file(output_file):
+    """Return the path of the index saved next to an output file."""
+    return f"{output_file}.index.pkl"
+
+
+def _source_key(output_file):
+    status = os.stat(output_file)
+    return status.st_size, status.st_mtime_ns
+
+
+class CutoffIndex:
+    """Sorted indexes over one parsed output frame.
+
+    rank_order lists the rows by (Category, Stage, Rank) with missing ranks
+    last in each group; point_orders lists them by the category code of each
+    POINT_COLUMNS column. Each order is kept with its sorted keys, so a query
+    is two searchsorted calls and a take of the matching rows.
+    """
+
+    def __init__(self, df):
+        df = df.reset_index(drop=True)
+        for column in ["Category", "Stage"] + POINT_COLUMNS:
+            if not isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype("category")
+        self.df = df
+
+        # (category, stage) pairs as one key; +1 keeps missing values (code -1) apart
+        self.stage_count = len(df["Stage"].cat.categories) + 1
+        groups = ((df["Category"].cat.codes.to_numpy(np.int64) + 1) * self.stage_count
+                  + df["Stage"].cat.codes.to_numpy(np.int64) + 1)
+        ranks = pd.to_numeric(df["Rank"]).to_numpy(np.float64, na_value=np.inf)
+        self.rank_order = np.lexsort((ranks, groups))
+        self.rank_groups = groups[self.rank_order]
+        self.rank_keys = ranks[self.rank_order]
+
+        self.point_codes = {}
+        self.point_orders = {}
+        for column in POINT_COLUMNS:
+            codes = df[column].cat.codes.to_numpy(np.int64)
+            order = np.argsort(codes, kind="stable")
+            self.point_codes[column] = codes
+            self.point_orders[column] = (order, codes[order])
+
+    def __len__(self):
+        return len(self.df)
+
+    @classmethod
+    def open(cls, output_file, rebuild=False):
+        """Load the index saved next to output_file, building and saving it if missing or stale."""
+        path = index_file(output_file)
+        source = _source_key(output_file)
+        if not rebuild:
+            try:
+                with open(path, "rb") as file:
+                    entry = pickle.load(file)
+                if entry["version"] == INDEX_VERSION and entry["source"] == source:
+                    return entry["index"]
+                logger.info("Index %s is stale, rebuilding", path)
+            except FileNotFoundError:
+                pass
+            except (pickle.UnpicklingError, EOFError, KeyError, ValueError) as e:
+                logger.warning("Ignoring unreadable index %s: %s", path, e)
+
+        start = time.perf_counter()
+        index = cls(read_output(output_file))
+        index.save(path, source)
+        logger.info("Indexed %s rows of %s in %.2f s", len(index), output_file, time.perf_counter() - start)
+        return index
+
+    def save(self, path, source):
+        """Write the index to path atomically, tagged with the output file it was built from."""
+        with atomic_path(path) as temp_name, open(temp_name, "wb") as file:
+            pickle.dump({"version": INDEX_VERSION, "source": source, "index": self}, file,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _code(self, column, value):
+        """Return the category code of value in column, or None if no row has it."""
+        categories = self.df[column].cat.categories
+        try:
+            return categories.get_loc(value)
+        except KeyError:
+            return None
+
+    def _rank_slice(self, category, stage, min_rank, max_rank):
+        """Return the rows of one (category, stage) group with min_rank <= rank <= max_rank."""
+        category_code = self._code("Category", category)
+        stage_code = self._code("Stage", stage)
+        if category_code is None or stage_code is None:
+            return self.rank_order[:0]
+        group = (category_code + 1) * self.stage_count + stage_code + 1
+        lo = np.searchsorted(self.rank_groups, group, "left")
+        hi = np.searchsorted(self.rank_groups, group, "right")
+        keys = self.rank_keys[lo:hi]
+        start = lo + np.searchsorted(keys, -np.inf if min_rank is None else min_rank, "left")
+        # Missing ranks sort as infinity and are never in range
+        end = lo + np.searchsorted(keys, np.inf if max_rank is None else max_rank,
+                                   "left" if max_rank is None else "right")
+        return self.rank_order[start:end]
+
+    def _point_slice(self, column, value):
+        """Return the rows whose column equals value, in document order."""
+        code = self._code(column, value)
+        order, keys = self.point_orders[column]
+        if code is None:
+            return order[:0]
+        return order[np.searchsorted(keys, code, "left"):np.searchsorted(keys, code, "right")]
+
+    def positions(self, category=None, stage=None, min_rank=None, max_rank=None, branch_code=None,
+                  district=None):
+        """Return the row positions matching every given filter.
+
+        A (category, stage) rank range comes back in rank order; other
+        queries come back in document order. Filters not served by the index
+        that was searched are applied to the matching rows only.
+        """
+        if (category is None) != (stage is None):
+            raise ValueError("category and stage must be given together")
+        filters = {"Branch Code": branch_code, "District": district}
+        if category is not None:
+            positions = self._rank_slice(category, stage, min_rank, max_rank)
+        else:
+            column = "Branch Code" if branch_code is not None else "District" if district is not None else None
+            if column is None:
+                raise ValueError("give a category and stage, a branch code or a district")
+            positions = self._point_slice(column, filters.pop(column))
+            if min_rank is not None or max_rank is not None:
+                ranks = pd.to_numeric(self.df["Rank"]).to_numpy(np.float64, na_value=np.inf)[positions]
+                positions = positions[(ranks >= (-np.inf if min_rank is None else min_rank))
+                                      & (ranks <= (np.inf if max_rank is None else max_rank))
+                                      & (ranks != np.inf)]
+        for column, value in filters.items():
+            if value is None or not len(positions):
+                continue
+            code = self._code(column, value)
+            if code is None:
+                return positions[:0]
+            positions = positions[self.point_codes[column][positions] == code]
+        return positions
+
+    def query(self, **filters):
+        """Return the rows matching the filters of positions() as a DataFrame."""
+        return self.df.take(self.positions(**filters))
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="cet-cutoffs query", description="Query a parsed cutoff output file.")
+    arg_parser.add_argument("output", help="Output file written by the parser (.parquet, .csv or .xlsx)")
+    arg_parser.add_argument("--category", default=None, help="Category, e.g. GOPENS (needs --stage)")
+    arg_parser.add_argument("--stage", default=None, help="Stage, e.g. I (needs --category)")
+    arg_parser.add_argument("--min-rank", type=int, default=None, help="Lowest closing rank to include")
+    arg_parser.add_argument("--max-rank", type=int, default=None, help="Highest closing rank to include")
+    arg_parser.add_argument("--branch", default=None, help="10-digit branch code")
+    arg_parser.add_argument("--district", default=None, help="District name")
+    arg_parser.add_argument("--rebuild", action="store_true", help="Rebuild the saved index first")
+    args = arg_parser.parse_args(argv)
+
+    if (args.category is None) != (args.stage is None):
+        arg_parser.error("--category and --stage must be given together")
+    if args.category is None and args.branch is None and args.district is None:
+        arg_parser.error("give --category and --stage, --branch or --district")
+
+    index = CutoffIndex.open(args.output, rebuild=args.rebuild)
+    start = time.perf_counter()
+    rows = index.query(category=args.category, stage=args.stage, min_rank=args.min_rank,
+                       max_rank=args.max_rank, branch_code=args.branch, district=args.district)
+    elapsed = time.perf_counter() - start
+    with pd.option_context("display.max_rows", None, "display.width", None):
+        print(rows.to_string(index=False) if len(rows) else "No matching rows")
+    logging.info(f"{len(rows)} rows in {elapsed * 1000:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    raise SystemExit(main())
@@ -0,0 +1,105 @@
+import re
+import mmap
+
+# Lines are split out of blocks of the mapped file of about this size
+BLOCK_SIZE = 1 << 20
+
+# An institute header at the start of a line. PDF dumps mix \r\n and bare \r
+# line endings, so a header may follow either character.
+institute_header_pattern = re.compile(rb"(?m)(?:^|(?<=\r))\d{5} - [^\r\n]+, [^\r\n]+")
+# Any line that starts like an institute header, with or without the district
+institute_prefix_pattern = re.compile(rb"(?m)(?:^|(?<=\r))\d{5} - [^\r\n]+")
+
+
+def count_lines(data):
+    """Count line breaks in a byte string, treating \\r\\n as a single break."""
+    return data.count(b"\n") + data.count(b"\r") - data.count(b"\r\n")
+
+
+def has_institute_prefix(line):
+    """Cheap check for a raw line that may be an institute header ("01002 - ...")."""
+    return line[:1].isdigit() and line[5:8] == b" - "
+
+
+class MappedTextFile:
+    """Memory-mapped cutoff text file that is read line by line.
+
+    The map is split into lines one block at a time, so memory stays flat
+    whatever the file size, and only lines that pass the optional accept(raw)
+    check are decoded. Every line is reported with its byte offset so results
+    can be traced back to the file. Line breaks are \\n, \\r\\n or a bare \\r,
+    the same as text-mode reading.
+    """
+
+    def __init__(self, path, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            self._map = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self._map)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def read(self, start, end):
+        """Return the raw bytes between two offsets."""
+        return self._map[start:end]
+
+    def institute_offsets(self):
+        """Return the byte offset of every institute header line, in order."""
+        return [match.start() for match in institute_header_pattern.finditer(self._map)]
+
+    def iter_institute_lines(self):
+        """Yield (byte offset, decoded line) for every line that starts like an institute header.
+
+        The map is searched with one regex scan, so other lines are never
+        split out or decoded.
+        """
+        for match in institute_prefix_pattern.finditer(self._map):
+            yield match.start(), match.group().decode(self.encoding)
+
+    def _block_end(self, pos, end):
+        """Return the end of the last complete line within BLOCK_SIZE bytes of pos."""
+        stop = pos + BLOCK_SIZE
+        if stop >= end:
+            return end
+        buffer = self._map
+        cut = max(buffer.rfind(b"\n", pos, stop), buffer.rfind(b"\r", pos, stop))
+        if cut < pos:
+            # A single line longer than the block; split at the block boundary
+            return stop
+        # Keep a \r\n pair in the same block
+        if buffer[cut] == 13 and cut + 1 < end and buffer[cut + 1] == 10:
+            cut += 1
+        return cut + 1
+
+    def iter_lines(self, start=0, end=None, accept=None):
+        """Yield (byte offset, decoded line) pairs without line terminators.
+
+        start and end restrict the scan to a byte range that begins at a
+        line boundary. Lines rejected by accept are skipped undecoded.
+        """
+        if end is None:
+            end = len(self._map)
+        encoding = self.encoding
+        pos = start
+        while pos < end:
+            stop = self._block_end(pos, end)
+            for raw in self._map[pos:stop].splitlines(keepends=True):
+                if accept is None or accept(raw):
+                    yield pos, raw.rstrip(b"\r\n").decode(encoding)
+                pos += len(raw)
@@ -0,0 +1,152 @@
+"""Structural checks over parsed cutoff rows, run on the columnar RowStore.
+
+    python parse_admission_cutoffs_corrected.py documents/2024ENGG_CAP2_CutOff.txt --validate --format csv
+
+The parser assigns ranks to categories by position, so a shifted category
+index misattributes a whole stage without any error. These checks catch the
+traces that leaves:
+
+- category_count: a stage row has fewer category slots (ranks plus blanks)
+  than the other stages of its table, the same branch, status and seat type;
+  MH rows list only MI and are not compared
+- duplicate_category: a category was filled more than once in one stage
+- stage_order: a stage comes after a later one in its table (I, II, I-Non, III ... VII)
+- percentile_range: a rank that is not positive or a percentile outside 0-100
+- rank_percentile: a rank without a percentile or the other way round
+- percentile_outlier: a percentile more than PERCENTILE_TOLERANCE away from
+  the median of the rows next to it in rank order, statewide
+
+Every check works on whole arrays. The only Python loops are over stage
+rows (contexts), which are far fewer than rows. Issues are reported once per
+stage and check, with the number of rows involved and the first of them.
+"""
+import logging
+
+from row_store import CONTEXT_FIELDS, ROW_COLUMNS
+
+logger = logging.getLogger("cutoffs")
+
+# Order of stage rows in a table as the CAP dumps list them; I-Non PWD and
+# I-Non Defence share the place after II
+STAGE_RANKS = {"I": 0, "II": 1, "I-Non": 2, "III": 3, "IV": 4, "V": 5, "VI": 6, "VII": 7}
+
+# Stages the parser fills from their own category list instead of the table
+# header's, so they are narrower than their table by design
+OWN_CATEGORY_STAGES = {"MH"}
+
+# Rows on each side of a row in rank order that its percentile is compared with
+OUTLIER_NEIGHBOURS = 2
+PERCENTILE_TOLERANCE = 1.0
+
+ISSUE_COLUMNS = ROW_COLUMNS[:CONTEXT_FIELDS] + ["Check", "Rows", "Detail", "Source Offset"]
+
+
+def stage_rank(stage):
+    """Return the place of a stage in table order, or -1 for stages without one (Defence, PWD, MH)."""
+    if stage.startswith("I-Non"):
+        return STAGE_RANKS["I-Non"]
+    return STAGE_RANKS.get(stage, -1)
+
+
+def _row_issues(issues, check, rows, context_codes, category_codes, ranks, percentiles, offsets, categories):
+    """Add one issue per stage for the flagged rows, describing the first of them."""
+    import numpy as np
+
+    rows = np.flatnonzero(rows) if rows.dtype == bool else rows
+    if not len(rows):
+        return
+    contexts, first, counts = np.unique(context_codes[rows], return_index=True, return_counts=True)
+    for context, row, count in zip(contexts.tolist(), rows[first].tolist(), counts.tolist()):
+        rank = ranks[row]
+        detail = f"{categories[category_codes[row]]} {'-' if rank < 0 else rank} ({percentiles[row]:g})"
+        issues.append((context, check, count, detail, offsets[row]))
+
+
+def validate_store(store):
+    """Run the structural checks over a RowStore; return the issues as a DataFrame of ISSUE_COLUMNS."""
+    import numpy as np
+    import pandas as pd
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    # The store's typed arrays are read in place, without a copy
+    context_codes = np.frombuffer(store.context_codes, dtype=store.context_codes.typecode).astype(np.intp)
+    category_codes = np.frombuffer(store.category_codes, dtype=store.category_codes.typecode).astype(np.intp)
+    ranks = np.frombuffer(store.ranks, dtype=store.ranks.typecode)
+    percentiles = np.frombuffer(store.percentiles, dtype=store.percentiles.typecode)
+    offsets = np.frombuffer(store.offsets, dtype=store.offsets.typecode)
+    context_count = len(store.contexts)
+    category_count = max(len(store.categories), 1)
+    issues = []  # (context id, check, rows, detail, first offset)
+
+    # Category slots per stage, against the widest stage of the same table,
+    # which has the header's categories
+    slots = np.bincount(context_codes, minlength=context_count)
+    keys, key_counts = np.unique(context_codes * category_count + category_codes, return_counts=True)
+    filled = np.bincount(keys // category_count, minlength=context_count)
+    tables, table_ids = {}, np.empty(context_count, dtype=np.intp)
+    for context_id, context in enumerate(store.contexts):
+        table_ids[context_id] = tables.setdefault(context[:CONTEXT_FIELDS - 1], len(tables))
+    widest = np.zeros(len(tables), dtype=np.int64)
+    np.maximum.at(widest, table_ids, filled)
+    first_offset = np.full(context_count, -1, dtype=np.int64)
+    first_offset[context_codes[::-1]] = offsets[::-1]
+    own_categories = np.array([context[4] in OWN_CATEGORY_STAGES for context in store.contexts], dtype=bool)
+    for context_id in np.flatnonzero((slots > 0) & ~own_categories & (filled < widest[table_ids])).tolist():
+        issues.append((context_id, "category_count", int(slots[context_id]),
+                       f"{filled[context_id]} of {widest[table_ids[context_id]]} categories", first_offset[context_id]))
+    for key, count in zip(keys[key_counts > 1].tolist(), key_counts[key_counts > 1].tolist()):
+        context_id, category = divmod(key, category_count)
+        issues.append((context_id, "duplicate_category", count, f"{store.categories[category]} filled {count} times",
+                       first_offset[context_id]))
+
+    # Stage order within each table, in the order the stage rows were first met
+    ranks_by_stage = {stage: stage_rank(stage) for stage in {context[4] for context in store.contexts}}
+    stage_ranks = np.array([ranks_by_stage[context[4]] for context in store.contexts], dtype=np.int64)
+    order = np.argsort(table_ids, kind="stable")
+    # Offsetting by table keeps the running maximum from crossing into the next table
+    keyed = stage_ranks[order] + table_ids[order] * (len(STAGE_RANKS) + 1)
+    latest = np.maximum.accumulate(keyed) if len(keyed) else keyed
+    for context_id in order[1:][(keyed[1:] < latest[:-1]) & (stage_ranks[order][1:] >= 0)].tolist():
+        issues.append((context_id, "stage_order", int(slots[context_id]),
+                       f"stage {store.contexts[context_id][4]} after a later stage", first_offset[context_id]))
+
+    # Ranks and percentiles of filled slots
+    row_args = (context_codes, category_codes, ranks, percentiles, offsets, store.categories)
+    has_rank = ranks >= 0
+    has_percentile = ~np.isnan(percentiles)
+    _row_issues(issues, "rank_percentile", has_rank != has_percentile, *row_args)
+    both = has_rank & has_percentile
+    out_of_range = both & ((ranks == 0) | (percentiles < 0) | (percentiles > 100))
+    _row_issues(issues, "percentile_range", out_of_range, *row_args)
+
+    # A lower rank is a higher percentile, so in rank order percentiles only fall
+    rows = np.flatnonzero(both & ~out_of_range)
+    if len(rows) > 2 * OUTLIER_NEIGHBOURS:
+        rows = rows[np.argsort(ranks[rows], kind="stable")]
+        by_rank = percentiles[rows]
+        window = sliding_window_view(np.pad(by_rank, OUTLIER_NEIGHBOURS, mode="edge"), 2 * OUTLIER_NEIGHBOURS + 1)
+        outliers = np.abs(by_rank - np.median(window, axis=1)) > PERCENTILE_TOLERANCE
+        _row_issues(issues, "percentile_outlier", np.sort(rows[outliers]), *row_args)
+
+    report = pd.DataFrame(issues, columns=["context", "Check", "Rows", "Detail", "Source Offset"])
+    for field, name in enumerate(ROW_COLUMNS[:CONTEXT_FIELDS]):
+        report.insert(field, name, [store.contexts[context_id][field] for context_id in report["context"]])
+    report["Branch Code"] = report["Branch Code"].map(lambda code: str(code).zfill(10))
+    report["Source Offset"] = pd.arrays.IntegerArray(
+        report["Source Offset"].to_numpy(np.int64), report["Source Offset"].to_numpy(np.int64) < 0)
+    return report.drop(columns="context").sort_values(
+        ["Branch Code", "Source Offset"], kind="stable", ignore_index=True)[ISSUE_COLUMNS]
+
+
+def log_validation(report):
+    """Write the issue counts per check and the suspect branches to the extraction log."""
+    if report.empty:
+        logger.info("Validation: no structural issues")
+        return
+    counts = report.groupby("Check", sort=True)["Rows"].agg(["size", "sum"])
+    for check, stages, rows in counts.itertuples(name=None):
+        logger.warning("Validation: %s in %s stages (%s rows)", check, stages, rows)
+    branches = report.groupby("Branch Code", sort=True)["Check"].agg(lambda checks: ", ".join(sorted(set(checks))))
+    logger.warning("Validation: %s suspect branches", len(branches))
+    for code, checks in branches.items():
+        logger.warning("Suspect branch %s: %s", code, checks)
@@ -0,0 +1,217 @@
+import os
+import shutil
+import logging
+import tempfile
+from contextlib import contextmanager
+
+logger = logging.getLogger("cutoffs")
+
+# Rows converted to plain Python values per batch when streaming to xlsx
+XLSX_BATCH_ROWS = 10000
+
+# Excel sheets stop at 1,048,576 rows, one of which is the header
+XLSX_MAX_ROWS = 1048575
+
+
+class XlsxStreamWriter:
+    """Stream frames to an xlsx sheet with openpyxl in write-only mode.
+
+    Memory stays constant in the number of rows. The Branch Code column is
+    typed as text once at the column level and its values are written as
+    plain strings, so leading zeros survive. The header is taken from the
+    first frame. A sheet holds at most XLSX_MAX_ROWS rows below the header;
+    a frame that would go past that raises ValueError before any of it is
+    written.
+    """
+
+    def __init__(self, output_file):
+        from openpyxl import Workbook
+
+        self.output_file = output_file
+        self.workbook = Workbook(write_only=True)
+        self.worksheet = self.workbook.create_sheet("Cutoffs")
+        self.text_column = None
+        self.rows = 0
+        self.started = False
+
+    def _write_header(self, columns):
+        from openpyxl.utils import get_column_letter
+
+        self.text_column = "Branch Code" if "Branch Code" in columns else None
+        if self.text_column is not None:
+            column_letter = get_column_letter(columns.index(self.text_column) + 1)
+            self.worksheet.column_dimensions[column_letter].number_format = "@"
+        self.worksheet.append(columns)
+        self.started = True
+
+    def write(self, df):
+        if self.rows + len(df) > XLSX_MAX_ROWS:
+            raise ValueError(f"{self.rows + len(df)} rows do not fit in an xlsx sheet "
+                             f"(at most {XLSX_MAX_ROWS}); use the parquet or csv format")
+        if not self.started:
+            self._write_header(list(df.columns))
+        if self.text_column is not None:
+            df = df.astype({self.text_column: str})
+        for start in range(0, len(df), XLSX_BATCH_ROWS):
+            batch = df.iloc[start:start + XLSX_BATCH_ROWS].astype(object)
+            batch = batch.where(batch.notna(), None)
+            for values in batch.itertuples(index=False, name=None):
+                self.worksheet.append(values)
+        self.rows += len(df)
+
+    def close(self):
+        self.workbook.save(self.output_file)
+
+
+class ParquetStreamWriter:
+    """Stream frames to one Parquet file, one row group per frame.
+
+    Categorical columns are written as plain strings, since each frame has
+    its own categories; Parquet dictionary-encodes them on its own.
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.writer = None
+
+    def write(self, df):
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        df = df.astype({column: "string" for column in df.columns
+                        if isinstance(df[column].dtype, pd.CategoricalDtype)})
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.output_file, table.schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class CsvStreamWriter:
+    """Stream frames to one CSV file, with the header of the first frame."""
+
+    def __init__(self, output_file):
+        self.file = open(output_file, "w", newline="", encoding="utf-8")
+        self.started = False
+
+    def write(self, df):
+        df.to_csv(self.file, index=False, header=not self.started)
+        self.started = True
+
+    def close(self):
+        self.file.close()
+
+
+def write_xlsx(df, output_file):
+    """Write the frame to an xlsx sheet through XlsxStreamWriter."""
+    writer = XlsxStreamWriter(output_file)
+    writer.write(df)
+    writer.close()
+
+
+def write_parquet(df, output_file):
+    """Write the frame to Parquet, keeping categorical and nullable integer types."""
+    df.to_parquet(output_file, index=False)
+
+
+def write_csv(df, output_file):
+    """Write the frame to plain CSV."""
+    df.to_csv(output_file, index=False)
+
+
+# Output format name -> (writer, file extension)
+WRITERS = {
+    "xlsx": (write_xlsx, "xlsx"),
+    "parquet": (write_parquet, "parquet"),
+    "csv": (write_csv, "csv"),
+}
+
+# Output format name -> writer class with write(df) and close(), for frames that arrive in batches
+STREAM_WRITERS = {
+    "xlsx": XlsxStreamWriter,
+    "parquet": ParquetStreamWriter,
+    "csv": CsvStreamWriter,
+}
+
+
+def output_path(base_name, output_format="xlsx", output_dir="."):
+    """Return the path of <base_name>_cutoffs_output.<ext> in output_dir."""
+    extension = WRITERS[output_format][1]
+    return os.path.join(output_dir, f"{base_name}_cutoffs_output.{extension}")
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temporary path next to path that is renamed over path when the block completes.
+
+    A reader never sees a partly written file, and a block that raises
+    leaves the old file in place and removes the temporary one. A replaced
+    file keeps its permissions; a new one is readable by all, unlike the
+    private files mkstemp creates.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    # Hidden, so directory listings and the watcher do not pick it up half written
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}_", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield temp_name
+        try:
+            shutil.copymode(path, temp_name)
+        except FileNotFoundError:
+            os.chmod(temp_name, 0o644)
+        os.replace(temp_name, path)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+
+def write_output(df, base_name, output_format="xlsx", output_dir="."):
+    """Write the frame as <base_name>_cutoffs_output.<ext> through atomic_path and return the path."""
+    writer = WRITERS[output_format][0]
+    output_file = output_path(base_name, output_format, output_dir)
+    with atomic_path(output_file) as temp_name:
+        writer(df, temp_name)
+    logger.info("%s file generated: %s", output_format, output_file)
+    return output_file
+
+
+def read_output(output_file):
+    """Read an output file written by write_output back into a frame.
+
+    Branch codes are read as text so their leading zeros are kept.
+    """
+    import pandas as pd
+
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension == ".parquet":
+        return pd.read_parquet(output_file)
+    if extension == ".csv":
+        return pd.read_csv(output_file, dtype={"Branch Code": str})
+    if extension == ".xlsx":
+        return pd.read_excel(output_file, dtype={"Branch Code": str})
+    raise ValueError(f"Unknown output format: {output_file}")
+
+
+def iter_output_chunks(output_file, chunk_rows=200000):
+    """Yield an output file written by write_output as frames of up to chunk_rows rows.
+
+    Parquet and CSV are read incrementally; an xlsx sheet is read whole and
+    then sliced.
+    """
+    import pandas as pd
+
+    extension = os.path.splitext(output_file)[1].lower()
+    if extension == ".parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(output_file).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif extension == ".csv":
+        yield from pd.read_csv(output_file, dtype={"Branch Code": str}, chunksize=chunk_rows)
+    else:
+        df = read_output(output_file)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
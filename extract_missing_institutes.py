@@ -1,43 +1,39 @@
-import pandas as pd
-import re
+import os
+import csv
+import heapq
+import shutil
 import logging
-from datetime import datetime
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('extract_institutes.log'),
-        logging.StreamHandler()
-    ]
-)
+import argparse
+
+from cutoff_reader import MappedTextFile
+from cutoff_writers import atomic_path
+from institute_mapping import InstituteMapping
+
+def configure_logging(log_file='extract_institutes.log'):
+    """Set up logging to the console and to log_file; called only when run as a script."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file, delay=True),
+            logging.StreamHandler()
+        ]
+    )
+
+# Columns of a new mapping CSV
+MAPPING_HEADER = ('Institute Code', 'Institute Name')
 
 def extract_institutes_from_text(text_file_path):
     """Extract all unique institute codes and names from the text file."""
     institutes = {}
-    institute_pattern = re.compile(r"^(\d{5}) - (.+)$")
     
     try:
-        with open(text_file_path, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-            logging.info(f"Reading {len(lines)} lines from {text_file_path}")
+        with MappedTextFile(text_file_path) as text_file:
+            logging.info(f"Scanning {len(text_file)} bytes from {text_file_path}")
             
-            for line_num, line in enumerate(lines, 1):
-                line = line.strip()
-                match = institute_pattern.match(line)
-                
-                if match:
-                    institute_code = match.group(1)
-                    institute_name = match.group(2)
-                    
-                    # Remove leading zeros from institute code for consistency with CSV
-                    institute_code_clean = institute_code.lstrip('0')
-                    
-                    # Store the institute (only if not already present to avoid duplicates)
-                    if institute_code_clean not in institutes:
-                        institutes[institute_code_clean] = institute_name
-                        logging.debug(f"Line {line_num}: Found institute {institute_code_clean} - {institute_name}")
+            # One regex scan finds the header lines; nothing else is decoded
+            for offset, line in text_file.iter_institute_lines():
+                add_institute(institutes, line.rstrip(), offset)
                     
         logging.info(f"Extracted {len(institutes)} unique institutes from text file")
         return institutes
@@ -49,26 +45,37 @@ def extract_institutes_from_text(text_file_path):
         logging.error(f"Error reading text file: {str(e)}")
         return {}
 
+def add_institute(institutes, header, offset=None):
+    """Record the code and name of an institute header line ("01002 - Name, District") if new."""
+    # Remove leading zeros from institute code for consistency with CSV
+    institute_code_clean = header[:5].lstrip('0')
+    
+    # Store the institute (only if not already present to avoid duplicates)
+    if institute_code_clean not in institutes:
+        institutes[institute_code_clean] = header[8:]
+        logging.debug(f"Byte {offset}: Found institute {institute_code_clean} - {header[8:]}")
+
 def load_existing_csv(csv_file_path):
-    """Load existing institute mapping CSV."""
+    """Load the institute mapping CSV as (header, rows, existing codes).
+
+    Rows are kept as read, in file order; codes are compared without
+    leading zeros.
+    """
     try:
-        df = pd.read_csv(csv_file_path)
-        logging.info(f"Loaded {len(df)} existing institutes from CSV")
-        
-        # Convert Institute Code to string and remove any leading zeros for consistency
-        df['Institute Code'] = df['Institute Code'].astype(str).str.lstrip('0')
+        with open(csv_file_path, newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            header = next(reader, None) or list(MAPPING_HEADER)
+            rows = [row for row in reader if row]
+        logging.info(f"Loaded {len(rows)} existing institutes from CSV")
         
         # Create a set of existing institute codes for quick lookup
-        existing_codes = set(df['Institute Code'].tolist())
+        existing_codes = {row[0].lstrip('0') for row in rows}
         
-        return df, existing_codes
+        return header, rows, existing_codes
         
     except FileNotFoundError:
         logging.error(f"CSV file '{csv_file_path}' not found")
-        return pd.DataFrame(columns=['Institute Code', 'Institute Name']), set()
-    except Exception as e:
-        logging.error(f"Error reading CSV file: {str(e)}")
-        return pd.DataFrame(columns=['Institute Code', 'Institute Name']), set()
+        return list(MAPPING_HEADER), [], set()
 
 def find_missing_institutes(extracted_institutes, existing_codes):
     """Find institutes that are missing from the CSV."""
@@ -81,61 +88,79 @@ def find_missing_institutes(extracted_institutes, existing_codes):
     logging.info(f"Found {len(missing_institutes)} missing institutes")
     return missing_institutes
 
-def update_csv_file(df, missing_institutes, csv_file_path):
-    """Update the CSV file with missing institutes."""
+def merge_rows(rows, missing_institutes):
+    """Insert the missing institutes into the sorted rows by numeric code, in one pass.
+
+    Existing rows keep their order; each new row goes before the first
+    existing row with a larger code.
+    """
+    new_rows = sorted(([code, name] for code, name in missing_institutes.items()), key=_code_key)
+    return list(heapq.merge(rows, new_rows, key=_code_key))
+
+def _code_key(row):
+    return int(row[0])
+
+def update_csv_file(csv_file_path, header, rows, missing_institutes):
+    """Write the CSV with the missing institutes merged in; return False if nothing changed.
+
+    The original is copied to <name>_backup.csv and the new file replaces
+    it by rename, so an interrupted run never leaves a partial CSV.
+    """
     if not missing_institutes:
         logging.info("No missing institutes to add")
-        return
+        return False
     
-    # Create new rows for missing institutes
-    new_rows = []
-    for code, name in missing_institutes.items():
-        new_rows.append({
-            'Institute Code': code,
-            'Institute Name': name
-        })
+    updated_rows = merge_rows(rows, missing_institutes)
     
-    # Create DataFrame from new rows
-    new_df = pd.DataFrame(new_rows)
-    
-    # Combine existing and new data
-    updated_df = pd.concat([df, new_df], ignore_index=True)
-    
-    # Sort by Institute Code (as integer for proper sorting)
-    updated_df['Institute Code'] = updated_df['Institute Code'].astype(str)
-    updated_df = updated_df.sort_values('Institute Code', key=lambda x: x.astype(int))
+    # Create backup of original file
+    backup_file = csv_file_path.replace('.csv', '_backup.csv')
+    if os.path.exists(csv_file_path):
+        shutil.copyfile(csv_file_path, backup_file)
+        logging.info(f"Created backup: {backup_file}")
     
-    # Save updated CSV
+    # Write to a temporary file next to the CSV, then swap it in
+    with atomic_path(csv_file_path) as temp_name, open(temp_name, "w", newline='', encoding='utf-8') as file:
+        # The mapping CSVs use LF line endings; csv.writer would rewrite every line as CRLF
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(updated_rows)
+    logging.info(f"Updated CSV saved with {len(missing_institutes)} new institutes")
+    return True
+
+def mapped_codes(csv_file_path):
+    """Return the institute codes of the mapping CSV, from the compiled mapping the parser shares."""
     try:
-        # Create backup of original file
-        backup_file = csv_file_path.replace('.csv', '_backup.csv')
-        df.to_csv(backup_file, index=False)
-        logging.info(f"Created backup: {backup_file}")
-        
-        # Save updated file
-        updated_df.to_csv(csv_file_path, index=False)
-        logging.info(f"Updated CSV saved with {len(new_rows)} new institutes")
-        
-        # Print summary of what was added
-        print(f"\n{'='*60}")
-        print(f"SUMMARY: Added {len(new_rows)} missing institutes")
-        print(f"{'='*60}")
-        for code, name in missing_institutes.items():
-            print(f"{code:>6} - {name}")
-        print(f"{'='*60}")
-        
-    except Exception as e:
-        logging.error(f"Error saving updated CSV: {str(e)}")
+        return InstituteMapping.open(csv_file_path).positions
+    except FileNotFoundError:
+        logging.error(f"CSV file '{csv_file_path}' not found")
+        return {}
 
-def main():
+def merge_institutes(csv_file_path, institutes):
+    """Add the institutes (code -> name) that the mapping CSV lacks; return the ones added.
+
+    Codes are checked against the compiled mapping first, so the CSV itself
+    is only read when there may be something to add. The compiled mapping
+    leaves out rows without a name, so the codes left over are checked
+    again against the code column of the CSV before it is rewritten. The
+    main parser calls this with the institutes it met while parsing, so the
+    text is read only once.
+    """
+    missing_institutes = find_missing_institutes(institutes, mapped_codes(csv_file_path))
+    if missing_institutes:
+        header, rows, existing_codes = load_existing_csv(csv_file_path)
+        missing_institutes = {code: name for code, name in missing_institutes.items() if code not in existing_codes}
+    if not missing_institutes:
+        logging.info("No missing institutes to add")
+        return missing_institutes
+    update_csv_file(csv_file_path, header, rows, missing_institutes)
+    return missing_institutes
+
+def main(text_file="documents/pdf__2024ENGG_CAP2_CutOff.txt",
+         csv_file="documents/institute_code_names_mapping_r2.csv"):
     """Main function to orchestrate the institute extraction and CSV update."""
     print("Institute Code Extraction and CSV Update Tool")
     print("=" * 50)
     
-    # File paths - Updated to use the uncropped file
-    text_file = "documents/pdf__2024ENGG_CAP2_CutOff.txt"
-    csv_file = "documents/institute_code_names_mapping_r2.csv"
-    
     # Step 1: Extract institutes from text file
     print("Step 1: Extracting institutes from uncropped text file...")
     extracted_institutes = extract_institutes_from_text(text_file)
@@ -146,27 +171,35 @@ def main():
     
     print(f"Found {len(extracted_institutes)} unique institutes in text file")
     
-    # Step 2: Load existing CSV
-    print("\nStep 2: Loading existing CSV mapping...")
-    existing_df, existing_codes = load_existing_csv(csv_file)
-    print(f"Loaded {len(existing_codes)} existing institutes from CSV")
-    
-    # Step 3: Find missing institutes
-    print("\nStep 3: Identifying missing institutes...")
-    missing_institutes = find_missing_institutes(extracted_institutes, existing_codes)
+    # Step 2: Merge missing institutes into the CSV
+    print("\nStep 2: Merging missing institutes into the CSV mapping...")
+    try:
+        missing_institutes = merge_institutes(csv_file, extracted_institutes)
+    except (OSError, ValueError, csv.Error) as e:
+        logging.error(f"Error updating CSV file: {str(e)}")
+        return
     
     if not missing_institutes:
         print("✅ All institutes from text file are already in the CSV mapping!")
         return
     
-    print(f"Found {len(missing_institutes)} missing institutes")
-    
-    # Step 4: Update CSV file
-    print("\nStep 4: Updating CSV file...")
-    update_csv_file(existing_df, missing_institutes, csv_file)
+    # Print summary of what was added
+    print(f"\n{'='*60}")
+    print(f"SUMMARY: Added {len(missing_institutes)} missing institutes")
+    print(f"{'='*60}")
+    for code, name in missing_institutes.items():
+        print(f"{code:>6} - {name}")
+    print(f"{'='*60}")
     
     print("\n✅ Process completed successfully!")
     print(f"📝 Check 'extract_institutes.log' for detailed logs")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Add institutes found in a cutoff text file to the mapping CSV.")
+    arg_parser.add_argument("text_file", nargs="?", default="documents/pdf__2024ENGG_CAP2_CutOff.txt",
+                            help="Uncropped cutoff text file to scan")
+    arg_parser.add_argument("--mapping", default="documents/institute_code_names_mapping_r2.csv",
+                            help="Institute code/name mapping CSV to update")
+    args = arg_parser.parse_args()
+    configure_logging()
+    main(args.text_file, args.mapping)
@@ -0,0 +1,158 @@
+"""The institute mapping CSV compiled into a lookup table cached across runs.
+
+    from institute_mapping import InstituteMapping
+    mapping = InstituteMapping.open("documents/institute_code_names_mapping_r2.csv")
+    mapping.lookup("1002")  # ("Government College of Engineering, Amravati", "Amravati")
+
+The CSV is read with the csv module, codes are stored without leading zeros
+and each institute's district is derived once, from the text after the last
+comma of its name. The compiled table is pickled next to the CSV as
+<csv>.cache.pkl and reused while the CSV keeps its size and mtime, or while
+its SHA-256 is unchanged when only the mtime moved. Both the parser and
+extract_missing_institutes.py open the mapping through here.
+"""
+import os
+import csv
+import time
+import pickle
+import hashlib
+import logging
+
+from cutoff_writers import atomic_path
+
+logger = logging.getLogger("cutoffs")
+
+# Bump when the compiled layout changes; older cache files are rebuilt
+CACHE_VERSION = "1"
+
+UNKNOWN_DISTRICT = "Unknown District"
+
+
+def cache_file(csv_path):
+    """Return the path of the compiled mapping kept next to a CSV."""
+    return f"{csv_path}.cache.pkl"
+
+
+def file_digest(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def district_of(name):
+    """Return the text after the last comma of an institute name, or UNKNOWN_DISTRICT."""
+    head, comma, district = name.rpartition(",")
+    return district.strip() if comma else UNKNOWN_DISTRICT
+
+
+class InstituteMapping:
+    """Institute code -> (name, district), in CSV order with a later row overriding an earlier one.
+
+    codes, names and districts are parallel lists and positions maps each
+    code to its index in them, so a lookup is one dict access. The object
+    holds only plain Python values: loading it needs neither pandas nor
+    numpy, and it pickles cheaply to worker processes.
+    """
+
+    def __init__(self, pairs):
+        positions = {}
+        names = []
+        for code, name in pairs:
+            code = code.strip().lstrip("0")
+            if not code or not name:
+                continue
+            if code in positions:
+                names[positions[code]] = name
+            else:
+                positions[code] = len(names)
+                names.append(name)
+        self.positions = positions
+        self.codes = list(positions)
+        self.names = names
+        self.districts = [district_of(name) for name in names]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code):
+        return code in self.positions
+
+    def lookup(self, code):
+        """Return (name, district) of a code without leading zeros, or None if it is not mapped."""
+        position = self.positions.get(code)
+        if position is None:
+            return None
+        return self.names[position], self.districts[position]
+
+    def lookup_many(self, codes):
+        """Look up an array of codes; return (names, districts, found) numpy arrays.
+
+        Each distinct code is looked up once. Codes that are not mapped get
+        None for name and district and False in found.
+        """
+        import numpy as np
+        import pandas as pd
+
+        inverse, uniques = pd.factorize(np.asarray(codes, dtype=object))
+        positions = np.array([self.positions.get(code, -1) for code in uniques], dtype=np.intp)[inverse]
+        # Position -1 selects the None appended at the end
+        names = np.array(self.names + [None], dtype=object)[positions]
+        districts = np.array(self.districts + [None], dtype=object)[positions]
+        return names, districts, positions >= 0
+
+    def rows(self):
+        """Yield (code, name, district) for every institute."""
+        return zip(self.codes, self.names, self.districts)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        """Compile the mapping CSV; the first two columns are the code and the name."""
+        with open(csv_path, newline="", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            return cls((row[0], row[1]) for row in reader if len(row) >= 2)
+
+    @classmethod
+    def open(cls, csv_path, rebuild=False):
+        """Return the compiled mapping of csv_path, from its cache file when that is still current.
+
+        Raises FileNotFoundError if the CSV does not exist.
+        """
+        status = os.stat(csv_path)
+        source = (status.st_size, status.st_mtime_ns)
+        path = cache_file(csv_path)
+        digest = None
+        if not rebuild:
+            try:
+                with open(path, "rb") as file:
+                    entry = pickle.load(file)
+                if entry["version"] == CACHE_VERSION:
+                    if entry["source"] == source:
+                        return entry["mapping"]
+                    # Touched or copied but maybe not edited: compare contents before recompiling
+                    digest = file_digest(csv_path)
+                    if entry["digest"] == digest:
+                        _save(path, entry["mapping"], source, digest)
+                        return entry["mapping"]
+                logger.info("Institute mapping cache %s is stale, rebuilding", path)
+            except FileNotFoundError:
+                pass
+            except (pickle.UnpicklingError, EOFError, KeyError, ValueError, AttributeError) as e:
+                logger.warning("Ignoring unreadable institute mapping cache %s: %s", path, e)
+
+        start = time.perf_counter()
+        digest = digest or file_digest(csv_path)
+        mapping = cls.from_csv(csv_path)
+        try:
+            _save(path, mapping, source, digest)
+        except OSError as e:
+            # A read-only documents directory still gets a mapping, just not a cached one
+            logger.warning("Could not write institute mapping cache %s: %s", path, e)
+        logger.info("Compiled %s institutes of %s in %.3f s", len(mapping), csv_path, time.perf_counter() - start)
+        return mapping
+
+
+def _save(path, mapping, source, digest):
+    """Write the compiled mapping to path atomically, tagged with the CSV it was built from."""
+    with atomic_path(path) as temp_name, open(temp_name, "wb") as file:
+        pickle.dump({"version": CACHE_VERSION, "source": source, "digest": digest, "mapping": mapping}, file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,93 @@
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+
+from cutoff_reader import MappedTextFile, count_lines
+from parse_admission_cutoffs_corrected import CutoffParser, logger
+
+# Aim for a few chunks per worker so uneven institute sizes still balance out
+CHUNKS_PER_WORKER = 4
+
+
+def plan_chunks(path, workers):
+    """Split a cutoff file at institute headers into (start, end, first_line) byte ranges.
+
+    Parser state is reset at every institute header, so each range can be
+    parsed on its own. Consecutive institute blocks are grouped until a range
+    holds roughly 1 / (workers * CHUNKS_PER_WORKER) of the file.
+    """
+    with MappedTextFile(path) as text_file:
+        size = len(text_file)
+        if size == 0:
+            return []
+        target = max(1, size // (workers * CHUNKS_PER_WORKER))
+        chunks = []
+        start = 0
+        first_line = 1
+        for boundary in text_file.institute_offsets():
+            if boundary - start >= target:
+                chunks.append((start, boundary, first_line))
+                first_line += count_lines(text_file.read(start, boundary))
+                start = boundary
+        chunks.append((start, size, first_line))
+    return chunks
+
+
+def _init_worker(log_queue, log_level):
+    """Send worker log records to the parent process instead of its handlers."""
+    logger.handlers[:] = [QueueHandler(log_queue)]
+    logger.setLevel(log_level)
+    logger.propagate = False
+
+
+def _parse_chunk(path, start, end, first_line):
+    """Parse one byte range of a cutoff file, returning its rows, stats and institutes."""
+    parser = CutoffParser()
+    with MappedTextFile(path) as text_file:
+        rows = list(parser.parse_lines(text_file.iter_lines(start, end), first_line))
+    return rows, parser.stats, parser.institutes
+
+
+class _ForwardToLogger(logging.Handler):
+    """Re-emit records from worker processes through the parent's loggers."""
+
+    def emit(self, record):
+        logging.getLogger(record.name).handle(record)
+
+
+class ParallelCutoffParser:
+    """Parse a cutoff file across processes, one group of institute blocks per task.
+
+    Rows are yielded in document order, so the output matches a single
+    CutoffParser run over the same file. Stats are summed over all chunks
+    and institutes collected from all of them.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.stats = CutoffParser().stats
+        self.institutes = {}
+
+    def iter_rows(self, path):
+        """Yield parsed rows from the file at path, in document order."""
+        chunks = plan_chunks(path, self.workers)
+        logger.info("Parsing %s in %s chunks with %s workers", path, len(chunks), self.workers)
+
+        log_queue = multiprocessing.Queue()
+        listener = QueueListener(log_queue, _ForwardToLogger())
+        listener.start()
+        try:
+            with ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                     initargs=(log_queue, logger.getEffectiveLevel())) as pool:
+                futures = [pool.submit(_parse_chunk, path, *chunk) for chunk in chunks]
+                for future in futures:
+                    rows, stats, institutes = future.result()
+                    for key, value in stats.items():
+                        self.stats[key] += value
+                    for code, name in institutes.items():
+                        self.institutes.setdefault(code, name)
+                    yield from rows
+        finally:
+            listener.stop()
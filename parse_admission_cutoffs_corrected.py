@@ -1,473 +1,947 @@
-import pandas as pd
 import re
-import uuid
 import logging
-from datetime import datetime
-from collections import deque
+import argparse
 import os
 
-# Set up logging to console and file
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('parsing_debug.log'),
-        logging.StreamHandler()
-    ]
-)
-
-# Initialize lists to store parsed data and extraction log
-data = []
-extraction_log = []
-current_institute = {}
-current_branch = {}
-current_status = ""
-current_seat_desc = ""
-current_stage = ""
-pending_categories = []
-last_categories = []  # Store categories from previous stage
-category_index = 0
-buffered_rank = None
-in_branch_block = False  # Track if we're inside a branch block
-skipped_categories = []  # Track categories that were skipped in previous stages
-i_non_detected = False  # Track if I-Non was detected
+from cutoff_reader import MappedTextFile
+from row_store import CutoffRow, RowStore
+from cutoff_writers import WRITERS, atomic_path, write_output
+from institute_mapping import InstituteMapping
+
+# Parser events go through this logger; the extraction log file is attached
+# to it as a handler so records are streamed to disk as they are emitted.
+logger = logging.getLogger("cutoffs")
 
 # Input file configuration
 input_filename = "documents/2024ENGG_CAP3_CutOff_cropped_1.txt"
-input_base_name = os.path.splitext(os.path.basename(input_filename))[0]
+mapping_csv = "documents/institute_code_names_mapping_r2.csv"
 
 # Regex patterns
 institute_pattern = re.compile(r"(\d{5}) - (.+), (.+)")
 branch_pattern = re.compile(r"(\d{10}) - (.+)")
 rank_pattern = re.compile(r"(\d+)\s*\(([\d.]+)\)")
-stage_pattern = re.compile(r"^(I|II|III|IV|V|VI|VII|I-Non|Defence|PWD|MH)$")
-
-# Statistics
-stats = {
-    "institutes_processed": 0,
-    "branches_processed": 0,
-    "stages_processed": 0,
-    "total_rows": 0
-}
-
-try:
-    # Read the actual data file
-    with open(input_filename, "r", encoding='utf-8') as file:
-        lines = file.readlines()
-        logging.info(f"Read {len(lines)} lines from {input_filename}")
-        extraction_log.append(f"{datetime.now()} - INFO - Read {len(lines)} lines from {input_filename}\n")
-
-        collecting_categories = False
-        i_non_detected = False
-        last_incomplete_branch = None
-        last_line_type = None  # 'rank', 'category', 'stage', 'branch', 'other'
-        overflow_categories = []
-        skip_lines = 0
-        for line_num, line in enumerate(lines, 1):
-            if skip_lines > 0:
-                skip_lines -= 1
-                continue
-            line = line.strip()
-            
-            logging.debug(f"Line {line_num}: Processing line - {line}")
-            extraction_log.append(f"{datetime.now()} - DEBUG - Line {line_num}: Processing line - {line}\n")
-
-            # Generalized I-Non stage handling
-            if i_non_detected and line:
-                current_stage = f"I-Non {line}"
-                stats["stages_processed"] += 1
-                i_non_detected = False
-                logging.info(f"Line {line_num}: Parsed stage - {current_stage}")
-                extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Parsed stage - {current_stage}\n")
-                # Reuse categories from previous stage for I-Non X
-                if not pending_categories and last_categories:
-                    pending_categories = last_categories.copy()
-                    logging.info(f"Line {line_num}: Reusing {len(pending_categories)} categories from previous stage for {current_stage}")
-                    extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Reusing {len(pending_categories)} categories from previous stage for {current_stage}\n")
-                # Reset category index for new stage
-                category_index = 0
-                last_line_type = 'stage'
-                continue
-
-            if line == "I-Non":
-                i_non_detected = True
-                logging.debug(f"Line {line_num}: Detected I-Non, waiting for next stage qualifier")
-                extraction_log.append(f"{datetime.now()} - DEBUG - Line {line_num}: Detected I-Non, waiting for next stage qualifier\n")
-                last_line_type = 'stage'
-                continue
-
-            # Skip empty lines outside branch blocks
-            if not line:
-                if collecting_categories:
-                    collecting_categories = False
-                if in_branch_block:
-                    if pending_categories and category_index < len(pending_categories):
-                        cat = pending_categories[category_index]
-                        logging.debug(f"Line {line_num}: Blank line for category index {category_index} ({cat}) in stage {current_stage}")
-                        extraction_log.append(f"{datetime.now()} - DEBUG - Line {line_num}: Blank line for category index {category_index} ({cat}) in stage {current_stage}\n")
-                        row = {
-                            "Institute Code": "",  # Will be filled later
-                            "Institute Name": "",  # Will be filled later
-                            "District": "",  # Will be filled later
-                            "Branch Code": str(current_branch.get("Branch Code", "")),  # Ensure string
-                            "Branch Name": current_branch.get("Branch Name", ""),
-                            "Status": current_status,
-                            "Seat Description": current_seat_desc,
-                            "Stage": current_stage,
-                            "Category": cat,
-                            "Rank": "",
-                            "Percentile": ""
-                        }
-                        data.append(row)
-                        stats["total_rows"] += 1
-                        skipped_categories.append(cat)
-                        logging.info(f"Line {line_num}: Added empty row for skipped category {cat} in stage {current_stage}")
-                        extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Added empty row for skipped category {cat} in stage {current_stage}\n")
-                        category_index += 1
-                    else:
-                        logging.warning(f"Line {line_num}: Blank line but no category to skip at index {category_index}")
-                        extraction_log.append(f"{datetime.now()} - WARNING - Line {line_num}: Blank line but no category to skip at index {category_index}\n")
-                last_line_type = 'other'
-                continue
-
-            # Parse institute (but don't store institute info yet)
-            if institute_pattern.match(line):
-                match = institute_pattern.match(line)
-                current_institute = {
-                    "Institute Code": match.group(1),
-                    "Institute Name": match.group(2),
-                    "District": match.group(3)
-                }
-                stats["institutes_processed"] += 1
-                logging.info(f"Line {line_num}: Parsed institute - {current_institute}")
-                extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Parsed institute - {current_institute}\n")
-                # Reset lower-level context
-                current_branch = {}
-                current_status = ""
-                current_seat_desc = ""
-                current_stage = ""
-                pending_categories = []
-                last_categories = []
-                category_index = 0
-                buffered_rank = None
-                in_branch_block = False
-                skipped_categories = []
-                i_non_detected = False
-                collecting_categories = False
-                last_line_type = 'branch'
-                continue
-
-            # Parse branch
-            if branch_pattern.match(line):
-                match = branch_pattern.match(line)
-                current_branch = {
-                    "Branch Code": str(match.group(1)),  # Ensure string to preserve leading zeros
-                    "Branch Name": match.group(2)
-                }
-                stats["branches_processed"] += 1
-                in_branch_block = True
-                logging.info(f"Line {line_num}: Parsed branch - {current_branch}")
-                extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Parsed branch - {current_branch}\n")
-                # Reset stage and category context
-                current_status = ""
-                current_seat_desc = ""
-                current_stage = ""
-                pending_categories = []
-                last_categories = []
-                category_index = 0
-                buffered_rank = None
-                skipped_categories = []
-                i_non_detected = False
-                collecting_categories = False
-                last_line_type = 'branch'
-                continue
-
-            # Parse status
-            if line.startswith("Status:"):
-                current_status = line.replace("Status:", "").strip()
-                logging.info(f"Line {line_num}: Parsed status - {current_status}")
-                extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Parsed status - {current_status}\n")
-                last_line_type = 'other'
-                continue
-
-            # Parse seat description
-            if line in ["State Level", "Home University Seats Allotted to Home University Candidates", 
-                        "Home University Seats Allotted to Other Than Home University Candidates",
-                        "Other Than Home University Seats Allotted to Other Than Home University Candidates"]:
-                current_seat_desc = line
-                logging.info(f"Line {line_num}: Parsed seat description - {current_seat_desc}")
-                extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Parsed seat description - {current_seat_desc}\n")
-                last_line_type = 'other'
-                continue
-
-            # Detect stage header
-            if line == "Stage":
-                pending_categories = []
-                category_index = 0
-                collecting_categories = True
-                logging.info(f"Line {line_num}: Detected stage header, will collect categories")
-                extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Detected stage header, will collect categories\n")
-                last_line_type = 'stage'
-                continue
-
-            # Parse stage
-            if stage_pattern.match(line):
-                current_stage = line
-                stats["stages_processed"] += 1
-                collecting_categories = False
-                logging.info(f"Line {line_num}: Parsed stage - {current_stage}")
-                extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Parsed stage - {current_stage}\n")
-                # Handle special stages that reuse categories from previous stage
-                if current_stage in ["I-Non", "Defence", "VII"] and not pending_categories:
-                    pending_categories = last_categories.copy()
-                    logging.info(f"Line {line_num}: Reusing {len(pending_categories)} categories from previous stage for {current_stage}")
-                    extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Reusing {len(pending_categories)} categories from previous stage for {current_stage}\n")
-                # Special handling for MH stage - it should only use MI category
-                elif current_stage == "MH":
-                    pending_categories = ["MI"]
-                    logging.info(f"Line {line_num}: Set MI as the only category for MH stage")
-                    extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Set MI as the only category for MH stage\n")
-                # Store categories for future reuse (excluding MH which has its own specific category MI)
-                if pending_categories and current_stage not in ["I-Non", "Defence", "VII", "I-Non PWD", "MH"]:
-                    last_categories = pending_categories.copy()
-                category_index = 0
-                last_line_type = 'stage'
-                continue
-
-            # Collect categories generically after 'Stage'
-            if collecting_categories:
-                if not stage_pattern.match(line):
-                    pending_categories.append(line)
-                    logging.info(f"Line {line_num}: Collected category - {line}")
-                    extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Collected category - {line}\n")
-                    last_line_type = 'category'
-                    continue
-                else:
-                    collecting_categories = False
-
-
-
-            # Parse rank and score (combined format, e.g., "28591 (90.4057549)")
-            rank_match = rank_pattern.match(line)
-            if rank_match:
-                rank = rank_match.group(1)
-                score = rank_match.group(2)
-                if pending_categories and category_index < len(pending_categories):
-                    cat = pending_categories[category_index]
-                    logging.debug(f"Line {line_num}: Assigning rank to category index {category_index} ({cat}) in stage {current_stage}")
-                    extraction_log.append(f"{datetime.now()} - DEBUG - Line {line_num}: Assigning rank to category index {category_index} ({cat}) in stage {current_stage}\n")
-                    row = {
-                        "Institute Code": "",  # Will be filled later
-                        "Institute Name": "",  # Will be filled later
-                        "District": "",  # Will be filled later
-                        "Branch Code": str(current_branch.get("Branch Code", "")),  # Ensure string
-                        "Branch Name": current_branch.get("Branch Name", ""),
-                        "Status": current_status,
-                        "Seat Description": current_seat_desc,
-                        "Stage": current_stage,
-                        "Category": cat,
-                        "Rank": rank,
-                        "Percentile": score
-                    }
-                    data.append(row)
-                    stats["total_rows"] += 1
-                    logging.info(f"Line {line_num}: Added row with rank - {rank} ({score}) for category {cat}")
-                    extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Added row with rank - {rank} ({score}) for category {cat}\n")
-                    category_index += 1
-                    # Mark this branch as incomplete in case overflowed categories appear next
-                    last_incomplete_branch = {
-                        "Institute Code": "",  # Will be filled later
-                        "Institute Name": "",  # Will be filled later
-                        "District": "",  # Will be filled later
-                        "Branch Code": str(current_branch.get("Branch Code", "")),  # Ensure string
-                        "Branch Name": current_branch.get("Branch Name", ""),
-                        "Status": current_status,
-                        "Seat Description": current_seat_desc,
-                        "Stage": current_stage
-                    }
-                else:
-                    logging.error(f"Line {line_num}: Rank found without categories or index out of range - {line}")
-                    extraction_log.append(f"{datetime.now()} - ERROR - Line {line_num}: Rank found without categories or index out of range - {line}\n")
-                last_line_type = 'rank'
-                continue
-
-            # Handle buffered rank (rank on one line, score on next)
-            if line.isdigit():
-                buffered_rank = line
-                logging.debug(f"Line {line_num}: Buffered rank - {buffered_rank}")
-                extraction_log.append(f"{datetime.now()} - DEBUG - Line {line_num}: Buffered rank - {buffered_rank}\n")
-                last_line_type = 'rank'
-                continue
-            if buffered_rank and line.startswith("(") and line.endswith(")"):
-                score = line[1:-1]
-                if pending_categories and category_index < len(pending_categories):
-                    cat = pending_categories[category_index]
-                    logging.debug(f"Line {line_num}: Assigning buffered rank to category index {category_index} ({cat}) in stage {current_stage}")
-                    extraction_log.append(f"{datetime.now()} - DEBUG - Line {line_num}: Assigning buffered rank to category index {category_index} ({cat}) in stage {current_stage}\n")
-                    row = {
-                        "Institute Code": "",  # Will be filled later
-                        "Institute Name": "",  # Will be filled later
-                        "District": "",  # Will be filled later
-                        "Branch Code": str(current_branch.get("Branch Code", "")),  # Ensure string
-                        "Branch Name": current_branch.get("Branch Name", ""),
-                        "Status": current_status,
-                        "Seat Description": current_seat_desc,
-                        "Stage": current_stage,
-                        "Category": cat,
-                        "Rank": buffered_rank,
-                        "Percentile": score
-                    }
-                    data.append(row)
-                    stats["total_rows"] += 1
-                    logging.info(f"Line {line_num}: Added row with rank - {buffered_rank} ({score}) for category {cat}")
-                    extraction_log.append(f"{datetime.now()} - INFO - Line {line_num}: Added row with rank - {buffered_rank} ({score}) for category {cat}\n")
-                    category_index += 1
-                    # Mark this branch as incomplete in case overflowed categories appear next
-                    last_incomplete_branch = {
-                        "Institute Code": "",  # Will be filled later
-                        "Institute Name": "",  # Will be filled later
-                        "District": "",  # Will be filled later
-                        "Branch Code": str(current_branch.get("Branch Code", "")),  # Ensure string
-                        "Branch Name": current_branch.get("Branch Name", ""),
-                        "Status": current_status,
-                        "Seat Description": current_seat_desc,
-                        "Stage": current_stage
-                    }
+STAGES = ["I", "II", "III", "IV", "V", "VI", "VII", "I-Non", "Defence", "PWD", "MH"]
+
+# Known category vocabulary: seat-type prefix, caste group and H/O/S suffix,
+# plus the standalone categories. The longest entry is 8 characters.
+CATEGORY_PREFIXES = ["G", "L", "PWD", "DEF", "PWDR", "DEFR"]
+CATEGORY_GROUPS = ["OPEN", "SC", "ST", "VJ", "NT1", "NT2", "NT3", "OBC", "SEBC"]
+STANDALONE_CATEGORIES = ["TFWS", "ORPHAN", "EWS", "MI"]
+CATEGORIES = frozenset(
+    [prefix + group + suffix for prefix in CATEGORY_PREFIXES for group in CATEGORY_GROUPS for suffix in "HOS"]
+    + STANDALONE_CATEGORIES)
+category_pattern = re.compile(
+    rf"(?:{'|'.join(sorted(CATEGORY_PREFIXES, key=len, reverse=True))})"
+    rf"(?:{'|'.join(CATEGORY_GROUPS)})[HOS]|{'|'.join(STANDALONE_CATEGORIES)}")
+MAX_CATEGORY_LENGTH = 8
+
+# Left-to-right order of the category columns in a stage table header, without
+# the H/O/S suffix. Overflow columns continue a table from this order onwards.
+CATEGORY_COLUMNS = [
+    prefix + group for prefix in CATEGORY_PREFIXES for group in CATEGORY_GROUPS
+] + STANDALONE_CATEGORIES
+_column_positions = {column: position for position, column in enumerate(CATEGORY_COLUMNS)}
+
+# One token of a concatenated run. Branch and institute headers run to the end
+# of the line; longer stage names are tried first so "VII" is not read as "V".
+concatenated_token_pattern = re.compile(
+    r"\s*(?:"
+    rf"(?P<branch>{branch_pattern.pattern})"
+    rf"|(?P<institute>{institute_pattern.pattern})"
+    rf"|(?P<rank>{rank_pattern.pattern})"
+    r"|(?P<keyword>Stage)"
+    rf"|(?P<stage>{'|'.join(sorted(STAGES, key=len, reverse=True))})(?![A-Za-z])"
+    rf"|(?P<category>{category_pattern.pattern})"
+    r")")
+
+SEAT_DESCRIPTIONS = [
+    "State Level",
+    "Home University Seats Allotted to Home University Candidates",
+    "Home University Seats Allotted to Other Than Home University Candidates",
+    "Other Than Home University Seats Allotted to Other Than Home University Candidates",
+]
+
+# Line kinds returned by classify_line
+LINE_BLANK = "blank"
+LINE_INSTITUTE = "institute"
+LINE_BRANCH = "branch"
+LINE_STATUS = "status"
+LINE_SEAT = "seat"
+LINE_STAGE_HEADER = "stage header"
+LINE_STAGE = "stage"
+LINE_I_NON = "I-Non"
+LINE_RANK = "rank"
+LINE_DIGITS = "digits"
+LINE_SCORE = "score"
+LINE_CATEGORY = "category"
+LINE_TEXT = "text"
+
+# Lines that are recognised by their whole text
+LINE_KEYWORDS = {"Stage": LINE_STAGE_HEADER, "I-Non": LINE_I_NON}
+LINE_KEYWORDS.update((seat, LINE_SEAT) for seat in SEAT_DESCRIPTIONS)
+LINE_KEYWORDS.update((stage, LINE_STAGE) for stage in STAGES if stage != "I-Non")
+LINE_KEYWORDS.update((category, LINE_CATEGORY) for category in CATEGORIES)
+
+NO_ROWS = ()
+
+# Bump when a change to the parser can change the rows it produces; cached
+# block results from other versions are then ignored.
+PARSER_VERSION = "6"
+
+OUTPUT_COLUMNS = [
+    "Institute Code", "Institute Name", "District", "Branch Code", "Branch Name",
+    "Status", "Seat Description", "Stage", "Category", "Rank", "Percentile",
+]
+
+
+class _OffsetLogger(logging.LoggerAdapter):
+    """Append the byte offset or PDF page of the line being parsed to parser log messages.
+
+    The level methods check the level themselves so a disabled call costs the
+    same as on a plain logger.
+    """
+
+    def __init__(self, logger, parser):
+        super().__init__(logger, {})
+        self.parser = parser
+
+    def process(self, msg, kwargs):
+        if self.parser.line_offset is not None:
+            msg = f"{msg} [byte {self.parser.line_offset}]"
+        elif self.parser.page is not None:
+            msg = f"{msg} [page {self.parser.page}]"
+        return msg, kwargs
+
+    def debug(self, msg, *args):
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(self.process(msg, {})[0], *args)
+
+    def info(self, msg, *args):
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(self.process(msg, {})[0], *args)
+
+    def warning(self, msg, *args):
+        if self.logger.isEnabledFor(logging.WARNING):
+            self.logger.warning(self.process(msg, {})[0], *args)
+
+    def error(self, msg, *args):
+        if self.logger.isEnabledFor(logging.ERROR):
+            self.logger.error(self.process(msg, {})[0], *args)
+
+
+def classify_line(line):
+    """Return (kind, match) for a stripped line, running at most one regex.
+
+    Lines are told apart by cheap checks first: a leading digit and the
+    position of " - " for headers and ranks, then a dict lookup for keywords,
+    stages, seat descriptions and categories. match is the regex match for
+    institute, branch and rank lines and None otherwise.
+    """
+    if not line:
+        return LINE_BLANK, None
+    if line[0].isdigit():
+        if line[5:8] == " - ":
+            match = institute_pattern.match(line)
+            return (LINE_INSTITUTE, match) if match else (LINE_TEXT, None)
+        if line[10:13] == " - ":
+            match = branch_pattern.match(line)
+            return (LINE_BRANCH, match) if match else (LINE_TEXT, None)
+        if line.isdigit():
+            return LINE_DIGITS, None
+        match = rank_pattern.match(line)
+        return (LINE_RANK, match) if match else (LINE_TEXT, None)
+    kind = LINE_KEYWORDS.get(line)
+    if kind is not None:
+        return kind, None
+    if line.startswith("Status:"):
+        return LINE_STATUS, None
+    if line[0] == "(" and line[-1] == ")":
+        return LINE_SCORE, None
+    return LINE_TEXT, None
+
+
+def column_position(category):
+    """Return the header column position of a category, or None if it is not a known column."""
+    position = _column_positions.get(category)
+    if position is None:
+        position = _column_positions.get(category[:-1])
+    return position
+
+
+class _StageTable:
+    """The stage rows of one branch and seat-description table.
+
+    Kept while the institute block is open so category columns that spilled
+    onto the next page can be attached to its stage rows.
+    """
+    __slots__ = ("context", "stages", "last_position", "start_line", "page")
+
+    def __init__(self, context, last_position, start_line):
+        self.context = context  # branch code, branch name, status, seat description
+        self.stages = []
+        self.last_position = last_position
+        self.start_line = start_line
+        self.page = None  # PDF page of the last stage row, when known
+
+
+class _OverflowFragment:
+    """Category columns found outside a Stage header, and the ranks that follow them."""
+    __slots__ = ("categories", "table", "slot")
+
+    def __init__(self, category):
+        self.categories = [category]
+        self.table = None
+        self.slot = None  # Next rank slot, None while the column names are being read
+
+
+class CutoffParser:
+    """Streaming parser for CAP cutoff text dumps.
+
+    All parsing state lives on the instance, so rows can be consumed one at a
+    time through iter_rows() without holding the file or the result in memory.
+    """
+
+    def __init__(self):
+        self.stats = {
+            "institutes_processed": 0,
+            "branches_processed": 0,
+            "stages_processed": 0,
+            "total_rows": 0,
+            # Per-event counters, written to the extraction log summary
+            "blank_category_fills": 0,
+            "unhandled_lines": 0,
+            "out_of_range_ranks": 0,
+            "malformed_ranks": 0,
+            "concatenated_lines": 0,
+            "overflow_fragments_reattached": 0,
+            "overflow_fragments_unplaced": 0
+        }
+        self.current_institute = {}
+        # Institute code without leading zeros -> name as in its header, for the mapping CSV
+        self.institutes = {}
+        self.last_line_type = None  # 'rank', 'category', 'stage', 'branch', 'other'
+        self.trace_lines = False
+        self.line_offset = None  # Byte offset of the current line, when known
+        self.page = None  # PDF page of the current line, when known
+        self.log = _OffsetLogger(logger, self)
+        # Stage tables of the current institute that overflow columns may
+        # continue, keyed by the position of their last header column
+        self.open_tables = {}
+        self.overflow = None  # The _OverflowFragment being read
+        self._reset_branch()
+
+    def _reset_branch(self):
+        """Reset stage and category context at an institute or branch header."""
+        self.current_branch = {}
+        self.current_status = ""
+        self.current_seat_desc = ""
+        self.current_stage = ""
+        self.pending_categories = []
+        self.last_categories = []  # Store categories from previous stage
+        self.category_index = 0
+        self.buffered_rank = None
+        self.in_branch_block = False  # Track if we're inside a branch block
+        self.skipped_categories = []  # Track categories that were skipped in previous stages
+        self.i_non_detected = False  # Track if I-Non was detected
+        self.collecting_categories = False
+        self.current_table = None
+
+    def _make_row(self, category, rank, score):
+        """Build an output row for the current branch context."""
+        return CutoffRow(
+            str(self.current_branch.get("Branch Code", "")),  # Ensure string
+            self.current_branch.get("Branch Name", ""),
+            self.current_status,
+            self.current_seat_desc,
+            self.current_stage,
+            category,
+            rank,
+            score,
+            self.line_offset,
+            self.page,
+        )
+
+    def _assign_rank(self, line_num, rank, score, label):
+        """Attach a rank to the next pending category, returning the new row."""
+        if self.pending_categories and self.category_index < len(self.pending_categories):
+            cat = self.pending_categories[self.category_index]
+            self.log.debug("Line %s: Assigning %s to category index %s (%s) in stage %s", line_num, label, self.category_index, cat, self.current_stage)
+            try:
+                row = self._make_row(cat, int(rank), float(score))
+            except ValueError:
+                self.stats["malformed_ranks"] += 1
+                self.log.error("Line %s: Malformed rank or percentile - %s (%s)", line_num, rank, score)
+                return None
+            self.stats["total_rows"] += 1
+            self.log.info("Line %s: Added row with rank - %s (%s) for category %s", line_num, rank, score, cat)
+            self.category_index += 1
+            return row
+        self.stats["out_of_range_ranks"] += 1
+        self.log.error("Line %s: Rank found without categories or index out of range - %s (%s)", line_num, rank, score)
+        return None
+
+    def _record_stage(self, line_num):
+        """Add the current stage as a row of the open stage table."""
+        if self.current_stage == "MH" or not self.pending_categories:
+            return
+        table = self.current_table
+        if table is None:
+            # First stage row under this Stage header; the header columns are complete
+            table = self.current_table = _StageTable(
+                (str(self.current_branch.get("Branch Code", "")), self.current_branch.get("Branch Name", ""),
+                 self.current_status, self.current_seat_desc),
+                column_position(self.pending_categories[-1]), line_num)
+            if table.last_position is not None:
+                self.open_tables[table.last_position] = table
+        table.stages.append(self.current_stage)
+        table.page = self.page
+
+    def _place_overflow(self, line_num):
+        """Attach the overflow fragment to the latest open table whose columns end before it."""
+        fragment = self.overflow
+        fragment.slot = 0
+        position = column_position(fragment.categories[0])
+        if position is not None:
+            # At most one table per header column, so this is a bounded scan.
+            # With page numbers, overflow columns continue the same or the previous page.
+            page = self.page
+            candidates = [table for last, table in self.open_tables.items()
+                          if last < position and (page is None or table.page is None or 0 <= page - table.page <= 1)]
+            fragment.table = max(candidates, key=lambda table: table.start_line, default=None)
+        table = fragment.table
+        if table is None:
+            self.stats["overflow_fragments_unplaced"] += 1
+            self.log.warning("Line %s: Unplaced overflow fragment - %s", line_num, " ".join(fragment.categories))
+            return
+        self.stats["overflow_fragments_reattached"] += 1
+        self.log.info("Line %s: Reattached overflow columns %s to branch %s (%s) across %s stages",
+                      line_num, " ".join(fragment.categories), table.context[0], table.context[3], len(table.stages))
+        # Further overflow columns continue after these
+        if self.open_tables.get(table.last_position) is table:
+            del self.open_tables[table.last_position]
+        table.last_position = column_position(fragment.categories[-1])
+        if table.last_position is not None:
+            self.open_tables[table.last_position] = table
+
+    def _fill_overflow_slot(self, line_num, rank, score):
+        """Assign a rank, or a blank when rank is None, to the next overflow slot."""
+        fragment = self.overflow
+        stage_index, column = divmod(fragment.slot, len(fragment.categories))
+        fragment.slot += 1
+        self.last_line_type = 'rank' if rank is not None else 'other'
+        table = fragment.table
+        if table is None or stage_index >= len(table.stages):
+            if rank is not None:
+                self.stats["out_of_range_ranks"] += 1
+                self.log.error("Line %s: Overflow rank without a stage row - %s (%s)", line_num, rank, score)
+            return NO_ROWS
+        category = fragment.categories[column]
+        stage = table.stages[stage_index]
+        if rank is not None:
+            try:
+                rank, score = int(rank), float(score)
+            except ValueError:
+                self.stats["malformed_ranks"] += 1
+                self.log.error("Line %s: Malformed rank or percentile - %s (%s)", line_num, rank, score)
+                return NO_ROWS
+        else:
+            self.stats["blank_category_fills"] += 1
+        self.stats["total_rows"] += 1
+        self.log.info("Line %s: Added overflow row with rank - %s (%s) for category %s in stage %s",
+                      line_num, rank, score, category, stage)
+        return (CutoffRow(*table.context, stage, category, rank, score, self.line_offset, self.page),)
+
+    def _feed_overflow(self, line_num, line, kind, rank_match):
+        """Feed a line to the open overflow fragment, or return None if the line ends it."""
+        fragment = self.overflow
+        if fragment.slot is None:
+            if kind == LINE_CATEGORY:
+                fragment.categories.append(line)
+                self.last_line_type = 'category'
+                return NO_ROWS
+            self._place_overflow(line_num)
+        if kind == LINE_BLANK:
+            return self._fill_overflow_slot(line_num, None, None)
+        if kind == LINE_RANK:
+            if rank_match.end() != len(line):
+                tokens = split_concatenated(line)
+                if tokens and len(tokens) > 1:
+                    return self._feed_tokens(line_num, tokens)
+            return self._fill_overflow_slot(line_num, rank_match.group(1), rank_match.group(2))
+        # A rank split over two lines fills one slot, as in a stage table
+        if kind == LINE_DIGITS:
+            self.buffered_rank = line
+            self.log.debug("Line %s: Buffered overflow rank - %s", line_num, self.buffered_rank)
+            self.last_line_type = 'rank'
+            return NO_ROWS
+        if self.buffered_rank and kind == LINE_SCORE:
+            rank, self.buffered_rank = self.buffered_rank, None
+            return self._fill_overflow_slot(line_num, rank, line[1:-1])
+        self.overflow = None
+        return None
+
+    def iter_rows(self, path_or_file):
+        """Yield parsed rows from a file path or an open text file, line by line.
+
+        Paths are memory-mapped and rows carry the byte offset of their source
+        line in "Source Offset"; for open files it is None.
+        """
+        if isinstance(path_or_file, (str, os.PathLike)):
+            with MappedTextFile(path_or_file) as text_file:
+                logger.info("Reading lines from %s", path_or_file)
+                yield from self.parse_lines(text_file.iter_lines())
+            return
+        yield from self.parse_lines((None, line) for line in path_or_file)
+
+    def parse_pages(self, pages):
+        """Yield parsed rows from (page number, lines) pairs, tagging each row with its page."""
+        def lines():
+            for self.page, page_lines in pages:
+                for line in page_lines:
+                    yield None, line
+        try:
+            yield from self.parse_lines(lines())
+        finally:
+            self.page = None
+
+    def parse_lines(self, lines, first_line=1):
+        """Yield parsed rows from (byte offset, line) pairs.
+
+        first_line is the line number of the first pair, for callers that
+        parse a slice of a larger file.
+        """
+        # Checked once per file so the per-line trace costs nothing when disabled
+        self.trace_lines = logger.isEnabledFor(logging.DEBUG)
+        line_num = first_line - 1
+        for line_num, (self.line_offset, line) in enumerate(lines, first_line):
+            yield from self.feed(line_num, line)
+        self.line_offset = None
+        logger.info("Read %s lines", line_num - first_line + 1)
+
+    def _feed_tokens(self, line_num, tokens):
+        """Feed the tokens of a concatenated line through the state machine."""
+        self.log.debug("Line %s: Split concatenated line into %s tokens", line_num, len(tokens))
+        self.stats["concatenated_lines"] += 1
+        rows = []
+        for kind, text in tokens:
+            rows.extend(self.feed(line_num, text))
+        return rows
+
+    def feed(self, line_num, line):
+        """Process one input line, returning the rows it completes."""
+        line = line.strip()
+
+        if self.trace_lines:
+            self.log.debug("Line %s: Processing line - %s", line_num, line)
+
+        kind, match = classify_line(line)
+
+        # Ranks under category columns that spilled over from the previous page
+        if self.overflow is not None:
+            rows = self._feed_overflow(line_num, line, kind, match)
+            if rows is not None:
+                return rows
+
+        # Generalized I-Non stage handling
+        if self.i_non_detected and kind != LINE_BLANK:
+            # The qualifier may have ranks glued on, e.g. "Defence109616 (57.0470967)..."
+            if len(line) > MAX_CATEGORY_LENGTH:
+                tokens = split_concatenated(line)
+                if tokens and len(tokens) > 1:
+                    return self._feed_tokens(line_num, tokens)
+            self.current_stage = f"I-Non {line}"
+            self.stats["stages_processed"] += 1
+            self.i_non_detected = False
+            self.log.info("Line %s: Parsed stage - %s", line_num, self.current_stage)
+            # Reuse categories from previous stage for I-Non X
+            if not self.pending_categories and self.last_categories:
+                self.pending_categories = self.last_categories.copy()
+                self.log.info("Line %s: Reusing %s categories from previous stage for %s", line_num, len(self.pending_categories), self.current_stage)
+            self._record_stage(line_num)
+            # Reset category index for new stage
+            self.category_index = 0
+            self.last_line_type = 'stage'
+            return NO_ROWS
+
+        if kind == LINE_I_NON:
+            self.i_non_detected = True
+            self.log.debug("Line %s: Detected I-Non, waiting for next stage qualifier", line_num)
+            self.last_line_type = 'stage'
+            return NO_ROWS
+
+        # Skip empty lines outside branch blocks
+        if kind == LINE_BLANK:
+            if self.collecting_categories:
+                self.collecting_categories = False
+            if self.in_branch_block:
+                if self.pending_categories and self.category_index < len(self.pending_categories):
+                    cat = self.pending_categories[self.category_index]
+                    self.log.debug("Line %s: Blank line for category index %s (%s) in stage %s", line_num, self.category_index, cat, self.current_stage)
+                    row = self._make_row(cat, None, None)
+                    self.stats["total_rows"] += 1
+                    self.stats["blank_category_fills"] += 1
+                    self.skipped_categories.append(cat)
+                    self.log.info("Line %s: Added empty row for skipped category %s in stage %s", line_num, cat, self.current_stage)
+                    self.category_index += 1
+                    self.last_line_type = 'other'
+                    return (row,)
                 else:
-                    logging.error(f"Line {line_num}: Rank found without categories or index out of range - {buffered_rank} ({score})")
-                    extraction_log.append(f"{datetime.now()} - ERROR - Line {line_num}: Rank found without categories or index out of range - {buffered_rank} ({score})\n")
-                buffered_rank = None
-                last_line_type = 'rank'
-                continue
-
-            # Log unhandled lines
-            logging.warning(f"Line {line_num}: Unhandled line - {line}")
-            extraction_log.append(f"{datetime.now()} - WARNING - Line {line_num}: Unhandled line - {line}\n")
-            last_line_type = 'other'
-
-    # Create DataFrame
-    df = pd.DataFrame(data)
-    logging.info(f"Total rows in DataFrame before college mapping: {len(df)}")
-    extraction_log.append(f"{datetime.now()} - INFO - Total rows in DataFrame before college mapping: {len(df)}\n")
-
-    # Now map college codes and names from CSV
-    try:
-        # Read the institute mapping CSV
-        institute_mapping = pd.read_csv("documents/institute_code_names_mapping_r2.csv")
-        logging.info(f"Loaded {len(institute_mapping)} institute mappings from CSV")
-        extraction_log.append(f"{datetime.now()} - INFO - Loaded {len(institute_mapping)} institute mappings from CSV\n")
-        
-        # Create a dictionary for quick lookup
-        institute_dict = {}
-        for _, row in institute_mapping.iterrows():
-            institute_dict[str(row['Institute Code'])] = {
-                'Institute Name': row['Institute Name'],
-                'District': row['Institute Name'].split(',')[-1].strip() if ',' in row['Institute Name'] else "Unknown District"
+                    self.log.warning("Line %s: Blank line but no category to skip at index %s", line_num, self.category_index)
+            self.last_line_type = 'other'
+            return NO_ROWS
+
+        # Parse institute (but don't store institute info yet)
+        if kind == LINE_INSTITUTE:
+            self.current_institute = {
+                "Institute Code": match.group(1),
+                "Institute Name": match.group(2),
+                "District": match.group(3)
             }
-        
-        # Map college codes and names for each row in the dataframe
-        college_mapping_stats = {"mapped": 0, "not_found": 0}
-        
-        for index, row in df.iterrows():
-            branch_code = str(row['Branch Code'])
-            if len(branch_code) >= 5:
-                # Extract first 5 digits and remove leading 0
-                college_code_with_zero = branch_code[:5]
-                college_code = college_code_with_zero.lstrip('0')
-                
-                if college_code in institute_dict:
-                    df.at[index, 'Institute Code'] = college_code
-                    df.at[index, 'Institute Name'] = institute_dict[college_code]['Institute Name']
-                    df.at[index, 'District'] = institute_dict[college_code]['District']
-                    college_mapping_stats["mapped"] += 1
-                else:
-                    df.at[index, 'Institute Code'] = "College Code Not Found"
-                    df.at[index, 'Institute Name'] = "College Name Not Found"
-                    df.at[index, 'District'] = "District Not Found"
-                    college_mapping_stats["not_found"] += 1
-                    logging.warning(f"College code {college_code} (from branch {branch_code}) not found in mapping CSV")
-                    extraction_log.append(f"{datetime.now()} - WARNING - College code {college_code} (from branch {branch_code}) not found in mapping CSV\n")
-            else:
-                df.at[index, 'Institute Code'] = "Invalid Branch Code"
-                df.at[index, 'Institute Name'] = "Invalid Branch Code"
-                df.at[index, 'District'] = "Invalid Branch Code"
-                college_mapping_stats["not_found"] += 1
-                logging.warning(f"Invalid branch code format: {branch_code}")
-                extraction_log.append(f"{datetime.now()} - WARNING - Invalid branch code format: {branch_code}\n")
-        
-        logging.info(f"College mapping complete: {college_mapping_stats['mapped']} mapped, {college_mapping_stats['not_found']} not found")
-        extraction_log.append(f"{datetime.now()} - INFO - College mapping complete: {college_mapping_stats['mapped']} mapped, {college_mapping_stats['not_found']} not found\n")
-        
+            self.stats["institutes_processed"] += 1
+            self.institutes.setdefault(match.group(1).lstrip('0'), line[8:])
+            self.log.info("Line %s: Parsed institute - %s", line_num, self.current_institute)
+            # Reset lower-level context; overflow pages never cross an institute
+            self._reset_branch()
+            self.open_tables.clear()
+            self.last_line_type = 'branch'
+            return NO_ROWS
+
+        # Parse branch
+        if kind == LINE_BRANCH:
+            self._reset_branch()
+            self.current_branch = {
+                "Branch Code": str(match.group(1)),  # Ensure string to preserve leading zeros
+                "Branch Name": match.group(2)
+            }
+            self.stats["branches_processed"] += 1
+            self.in_branch_block = True
+            self.log.info("Line %s: Parsed branch - %s", line_num, self.current_branch)
+            self.last_line_type = 'branch'
+            return NO_ROWS
+
+        # Parse status
+        if kind == LINE_STATUS:
+            self.current_status = line.replace("Status:", "").strip()
+            self.log.info("Line %s: Parsed status - %s", line_num, self.current_status)
+            self.last_line_type = 'other'
+            return NO_ROWS
+
+        # Parse seat description
+        if kind == LINE_SEAT:
+            self.current_seat_desc = line
+            self.log.info("Line %s: Parsed seat description - %s", line_num, self.current_seat_desc)
+            self.last_line_type = 'other'
+            return NO_ROWS
+
+        # Detect stage header
+        if kind == LINE_STAGE_HEADER:
+            self.pending_categories = []
+            self.category_index = 0
+            self.collecting_categories = True
+            self.current_table = None
+            self.log.info("Line %s: Detected stage header, will collect categories", line_num)
+            self.last_line_type = 'stage'
+            return NO_ROWS
+
+        # Parse stage
+        if kind == LINE_STAGE:
+            self.current_stage = line
+            self.stats["stages_processed"] += 1
+            self.collecting_categories = False
+            self.log.info("Line %s: Parsed stage - %s", line_num, self.current_stage)
+            # Handle special stages that reuse categories from previous stage
+            if self.current_stage in ["I-Non", "Defence", "VII"] and not self.pending_categories:
+                self.pending_categories = self.last_categories.copy()
+                self.log.info("Line %s: Reusing %s categories from previous stage for %s", line_num, len(self.pending_categories), self.current_stage)
+            # Special handling for MH stage - it should only use MI category
+            elif self.current_stage == "MH":
+                self.pending_categories = ["MI"]
+                self.log.info("Line %s: Set MI as the only category for MH stage", line_num)
+            # Store categories for future reuse (excluding MH which has its own specific category MI)
+            if self.pending_categories and self.current_stage not in ["I-Non", "Defence", "VII", "I-Non PWD", "MH"]:
+                self.last_categories = self.pending_categories.copy()
+            self._record_stage(line_num)
+            self.category_index = 0
+            self.last_line_type = 'stage'
+            return NO_ROWS
+
+        # Collect categories generically after 'Stage'
+        if self.collecting_categories:
+            # Nothing in the vocabulary is longer, so this is a glued run
+            if len(line) > MAX_CATEGORY_LENGTH:
+                tokens = split_concatenated(line)
+                if tokens and len(tokens) > 1:
+                    return self._feed_tokens(line_num, tokens)
+            self.pending_categories.append(line)
+            self.log.info("Line %s: Collected category - %s", line_num, line)
+            self.last_line_type = 'category'
+            return NO_ROWS
+
+        # Parse rank and score (combined format, e.g., "28591 (90.4057549)")
+        if kind == LINE_RANK:
+            # More ranks or a branch header glued after the first rank
+            if match.end() != len(line):
+                tokens = split_concatenated(line)
+                if tokens and len(tokens) > 1:
+                    return self._feed_tokens(line_num, tokens)
+            row = self._assign_rank(line_num, match.group(1), match.group(2), "rank")
+            self.last_line_type = 'rank'
+            return (row,) if row is not None else NO_ROWS
+
+        # Handle buffered rank (rank on one line, score on next)
+        if kind == LINE_DIGITS:
+            self.buffered_rank = line
+            self.log.debug("Line %s: Buffered rank - %s", line_num, self.buffered_rank)
+            self.last_line_type = 'rank'
+            return NO_ROWS
+        if self.buffered_rank and kind == LINE_SCORE:
+            row = self._assign_rank(line_num, self.buffered_rank, line[1:-1], "buffered rank")
+            self.buffered_rank = None
+            self.last_line_type = 'rank'
+            return (row,) if row is not None else NO_ROWS
+
+        # Category columns outside a Stage header spilled over from the previous page
+        if kind == LINE_CATEGORY:
+            self.overflow = _OverflowFragment(line)
+            self.log.info("Line %s: Overflow fragment starts with category %s", line_num, line)
+            self.last_line_type = 'category'
+            return NO_ROWS
+
+        # Try the concatenated layout, e.g. "StageGOPENSGSCS...  I99953 (61.8908693)..."
+        tokens = split_concatenated(line)
+        if tokens and len(tokens) > 1:
+            return self._feed_tokens(line_num, tokens)
+
+        # Log unhandled lines
+        self.stats["unhandled_lines"] += 1
+        self.log.warning("Line %s: Unhandled line - %s", line_num, line)
+        self.last_line_type = 'other'
+        return NO_ROWS
+
+
+def split_concatenated(line):
+    """Split a line of glued tokens into (kind, text) pairs in one scan.
+
+    Kinds are branch, institute, rank, keyword, stage and category. Returns
+    None when the line does not consist entirely of known tokens.
+    """
+    tokens = []
+    pos = 0
+    end = len(line)
+    while pos < end:
+        match = concatenated_token_pattern.match(line, pos)
+        if match is None or match.end() == pos:
+            return None
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+
+def configure_logging(log_file='parsing_debug.log'):
+    """Set up logging to the console and to log_file.
+
+    Called by the command-line entry points, so importing the module leaves
+    logging alone; the file is only created once a record is written to it.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file, delay=True),
+            logging.StreamHandler()
+        ]
+    )
+
+
+def map_institutes(df, institute_mapping):
+    """Fill institute code, name and district from the compiled institute mapping in place.
+
+    The college code is the first five digits of the branch code without
+    leading zeros. Rows whose code is not in the mapping, or whose branch code
+    is too short, get the "Not Found" / "Invalid Branch Code" sentinels.
+    Returns mapped and not-found row counts per college code.
+    """
+    import pandas as pd
+
+    branch_codes = df['Branch Code'].astype(str)
+    college_codes = branch_codes.str[:5].str.lstrip('0')
+    valid = branch_codes.str.len() >= 5
+
+    names, districts, found = institute_mapping.lookup_many(college_codes)
+    found = valid & found
+
+    df['Institute Code'] = college_codes.where(found, "College Code Not Found").where(valid, "Invalid Branch Code")
+    df['Institute Name'] = pd.Series(names, index=df.index).where(found, "College Name Not Found").where(
+        valid, "Invalid Branch Code")
+    df['District'] = pd.Series(districts, index=df.index).where(found, "District Not Found").where(
+        valid, "Invalid Branch Code")
+
+    counts = pd.DataFrame({
+        'College Code': college_codes.where(valid, "Invalid Branch Code"),
+        'mapped': found,
+        'not_found': ~found,
+    }).groupby('College Code', sort=True)[['mapped', 'not_found']].sum()
+    return counts
+
+
+def open_extraction_log(log_file_name):
+    """Attach a handler that streams parser log records to the extraction log file."""
+    handler = logging.FileHandler(log_file_name, mode="w", encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(handler)
+    return handler
+
+
+def log_summary(stats):
+    """Write the run summary and per-event counters to the extraction log."""
+    logger.info("Summary: %s institutes, %s branches, %s stages, %s total rows",
+                stats['institutes_processed'], stats['branches_processed'],
+                stats['stages_processed'], stats['total_rows'])
+    logger.info("Events: %s rows added, %s blank-category fills, %s unhandled lines, %s out-of-range ranks, %s malformed ranks",
+                stats['total_rows'], stats['blank_category_fills'],
+                stats['unhandled_lines'], stats['out_of_range_ranks'], stats['malformed_ranks'])
+    logger.info("Overflow fragments: %s reattached, %s unplaced",
+                stats['overflow_fragments_reattached'], stats['overflow_fragments_unplaced'])
+
+
+def load_institute_mapping(mapping_csv):
+    """Return the compiled InstituteMapping of the CSV, or None if it does not exist.
+
+    The compiled table is cached next to the CSV and only rebuilt when the
+    CSV changes.
+    """
+    try:
+        institute_mapping = InstituteMapping.open(mapping_csv)
     except FileNotFoundError:
-        logging.error("Institute mapping CSV file not found")
-        extraction_log.append(f"{datetime.now()} - ERROR - Institute mapping CSV file not found\n")
+        logger.error("Institute mapping CSV file not found")
+        return None
+    logger.info("Loaded %s institute mappings from CSV", len(institute_mapping))
+    return institute_mapping
+
+
+def log_institute_counts(institute_counts):
+    """Log the mapped and not-found row counts per college code returned by map_institutes."""
+    for code, mapped, not_found in institute_counts.itertuples():
+        logger.info("Institute %s: %s mapped, %s not found", code, mapped, not_found)
+        if code == "Invalid Branch Code":
+            logger.warning("Invalid branch code format on %s rows", not_found)
+        elif not_found:
+            logger.warning("College code %s not found in mapping CSV (%s rows)", code, not_found)
+    logger.info("College mapping complete: %s mapped, %s not found",
+                institute_counts['mapped'].sum(), institute_counts['not_found'].sum())
+
+
+def apply_institute_mapping(df, institute_mapping, log_counts=True):
+    """Fill the institute columns, using sentinels when the mapping is missing or fails.
+
+    Returns the per-college counts of map_institutes, or None if no mapping
+    was applied. With log_counts False the caller logs them, e.g. once for
+    many batches.
+    """
+    if institute_mapping is None:
         # Fill with default values if CSV not found
         df['Institute Code'] = "CSV File Not Found"
         df['Institute Name'] = "CSV File Not Found"
         df['District'] = "CSV File Not Found"
+        return None
+    try:
+        # Map college codes and names for every row as one columnar join
+        institute_counts = map_institutes(df, institute_mapping)
     except Exception as e:
-        logging.error(f"Error during college mapping: {str(e)}")
-        extraction_log.append(f"{datetime.now()} - ERROR - Error during college mapping: {str(e)}\n")
+        logger.error("Error during college mapping: %s", e)
         # Fill with error values if mapping fails
         df['Institute Code'] = "Mapping Error"
         df['Institute Name'] = "Mapping Error"
         df['District'] = "Mapping Error"
+        return None
+    if log_counts:
+        log_institute_counts(institute_counts)
+    return institute_counts
+
 
-    # Log summary of missing values per category
-    if not df.empty:
-        for category in df['Category'].unique():
-            missing = df[(df['Category'] == category) & (df['Rank'] == "")].shape[0]
-            logging.info(f"Category {category}: {missing} missing values")
-            extraction_log.append(f"{datetime.now()} - INFO - Category {category}: {missing} missing values\n")
+def process_file(input_filename, institute_mapping, output_format="xlsx", output_dir=".", workers=None,
+                 cache_dir=None, update_mapping=None, profile=False, profile_parse=False, trace_memory=False,
+                 quarantine=False, validate=False):
+    """Parse one cutoff text or PDF file, map its institutes and write its output.
+
+    Returns the output DataFrame, or None if the file could not be processed.
+    PDF pages are extracted in workers processes and the output gets a Page
+    column. For text files with cache_dir set, only institute blocks that
+    changed since an earlier run are parsed; otherwise with workers set,
+    institute blocks are parsed in that many processes. With quarantine set,
+    a text file is parsed one institute block at a time and blocks that fail
+    go to <name>_quarantine.txt instead of the output. With update_mapping
+    set to the mapping CSV, institutes met while parsing that the CSV lacks
+    are added to it and used for this file. With validate set, the parsed
+    rows are checked for structural problems (see cutoff_validation.py) and
+    the issues are written to <name>_validation.<ext>.
+
+    With profile set, the wall time, CPU time and peak memory of each stage
+    are written to <name>_profile.json next to the output (trace_memory adds
+    tracemalloc peaks); profile_parse dumps cProfile stats of the parse
+    stage to <name>_parse.prof.
+    """
+    from stage_profiler import StageProfiler, profile_calls
+
+    input_base_name = os.path.splitext(os.path.basename(input_filename))[0]
+    log_file_name = os.path.join(output_dir, f"{input_base_name}_extraction_log.txt")
+    profiler = StageProfiler(enabled=profile, trace_memory=trace_memory)
+    parse_stats_file = os.path.join(output_dir, f"{input_base_name}_parse.prof") if profile_parse else None
+    log_handler = open_extraction_log(log_file_name)
+    if input_filename.lower().endswith(".pdf"):
+        from pdf_ingest import PdfCutoffParser
+        parser = PdfCutoffParser(workers)
+    elif quarantine:
+        from quarantine import QuarantiningCutoffParser
+        parser = QuarantiningCutoffParser(os.path.join(output_dir, f"{input_base_name}_quarantine.txt"))
+    elif cache_dir:
+        from block_cache import CachedCutoffParser
+        parser = CachedCutoffParser(cache_dir)
+    elif workers:
+        from parallel_parse import ParallelCutoffParser
+        parser = ParallelCutoffParser(workers)
     else:
-        logging.warning("DataFrame is empty, no data was parsed")
-        extraction_log.append(f"{datetime.now()} - WARNING - DataFrame is empty, no data was parsed\n")
-
-    # Log summary statistics
-    logging.info(f"Summary: {stats['institutes_processed']} institutes, {stats['branches_processed']} branches, {stats['stages_processed']} stages, {stats['total_rows']} total rows")
-    extraction_log.append(f"{datetime.now()} - INFO - Summary: {stats['institutes_processed']} institutes, {stats['branches_processed']} branches, {stats['stages_processed']} stages, {stats['total_rows']} total rows\n")
-
-    # Ensure branch codes are treated as strings to preserve leading zeros
-    # Apply string formatting to restore leading zeros if they were lost
-    df['Branch Code'] = df['Branch Code'].astype(str).str.zfill(10)
-    
-    # Save to Excel with filename based on input file using ExcelWriter to format as text
-    output_file = f"{input_base_name}_cutoffs_output.xlsx"
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Cutoffs', index=False)
-        
-        # Get the workbook and worksheet objects
-        from openpyxl.styles import NamedStyle
-        workbook = writer.book
-        worksheet = writer.sheets['Cutoffs']
-        
-        # Format the Branch Code column as text to preserve leading zeros
-        text_style = NamedStyle(name="text_style", number_format="@")
-        for row in range(1, len(df) + 2):  # Starting from row 1 (including header)
-            cell = worksheet[f'D{row}']  # Column D is Branch Code
-            cell.number_format = "@"  # Text format
-    
-    logging.info(f"Excel file generated: {output_file}")
-    extraction_log.append(f"{datetime.now()} - INFO - Excel file generated: {output_file}\n")
-
-    # Save extraction log with filename based on input file
-    log_file_name = f"{input_base_name}_extraction_log.txt"
-    with open(log_file_name, "w", encoding='utf-8') as log_file:
-        log_file.writelines(extraction_log)
-    logging.info(f"Extraction log generated: {log_file_name}")
-    extraction_log.append(f"{datetime.now()} - INFO - Extraction log generated: {log_file_name}\n")
-
-except FileNotFoundError:
-    logging.error(f"Data file '{input_filename}' not found. Please ensure the file exists in the same directory as the script.")
-    extraction_log.append(f"{datetime.now()} - ERROR - Data file '{input_filename}' not found.\n")
-except ValueError as ve:
-    logging.error(f"Input file error: {str(ve)}")
-    extraction_log.append(f"{datetime.now()} - ERROR - Input file error: {str(ve)}\n")
-except Exception as e:
-    logging.error(f"An error occurred: {str(e)}")
-    extraction_log.append(f"{datetime.now()} - ERROR - An error occurred: {str(e)}\n")
-
-# Ensure extraction log is saved even if an exception occurs
-log_file_name = f"{input_base_name}_extraction_log.txt"
-with open(log_file_name, "w", encoding='utf-8') as log_file:
-    log_file.writelines(extraction_log)
\ No newline at end of file
+        parser = CutoffParser()
+    stats = parser.stats
+    df = None
+
+    try:
+        store = RowStore()
+        with profiler.stage("parse"), profile_calls(parse_stats_file):
+            store.extend(parser.iter_rows(input_filename))
+
+        if validate:
+            from cutoff_validation import log_validation, validate_store
+            with profiler.stage("validate"):
+                issues = validate_store(store)
+                log_validation(issues)
+                writer, extension = WRITERS[output_format]
+                validation_file = os.path.join(output_dir, f"{input_base_name}_validation.{extension}")
+                with atomic_path(validation_file) as temp_name:
+                    writer(issues, temp_name)
+            logger.info("Validation report generated: %s", validation_file)
+
+        if update_mapping:
+            from extract_missing_institutes import merge_institutes
+            with profiler.stage("update mapping"):
+                if merge_institutes(update_mapping, parser.institutes):
+                    institute_mapping = load_institute_mapping(update_mapping)
+
+        # Create DataFrame
+        with profiler.stage("frame"):
+            df = store.to_frame()
+        logger.info("Total rows in DataFrame before college mapping: %s", len(df))
+
+        # Now map college codes and names from the mapping CSV
+        with profiler.stage("map"):
+            apply_institute_mapping(df, institute_mapping)
+
+        # Log summary of missing values per category
+        with profiler.stage("missing summary"):
+            if not df.empty:
+                for category in df['Category'].unique():
+                    missing = df[(df['Category'] == category) & df['Rank'].isna()].shape[0]
+                    logger.info("Category %s: %s missing values", category, missing)
+            else:
+                logger.warning("DataFrame is empty, no data was parsed")
+
+        # Log summary statistics
+        log_summary(stats)
+
+        with profiler.stage("format"):
+            # Ensure branch codes are treated as strings to preserve leading zeros
+            # Apply string formatting to restore leading zeros if they were lost
+            df['Branch Code'] = df['Branch Code'].cat.rename_categories(lambda code: str(code).zfill(10))
+            # Rows read from a PDF keep their page number
+            df = df[OUTPUT_COLUMNS + ["Page"] if df['Page'].notna().any() else OUTPUT_COLUMNS]
+
+        # Save with filename based on input file in the requested format
+        with profiler.stage("write"):
+            output_file = write_output(df, input_base_name, output_format, output_dir)
+
+        if profile:
+            report_file = profiler.write_json(
+                os.path.join(output_dir, f"{input_base_name}_profile.json"),
+                input_file=input_filename, output_file=output_file, output_format=output_format,
+                parser=type(parser).__name__, rows=len(df), parse_stats_file=parse_stats_file)
+            logger.info("Profile report generated: %s", report_file)
+
+    except FileNotFoundError:
+        df = None
+        logger.error("Data file '%s' not found. Please ensure the file exists in the same directory as the script.", input_filename)
+    except ValueError as ve:
+        df = None
+        logger.error("Input file error: %s", ve)
+    except Exception as e:
+        df = None
+        logger.error("An error occurred: %s", e)
+    finally:
+        # The extraction log is written as records arrive; just close it out
+        logger.removeHandler(log_handler)
+        log_handler.close()
+    logger.info("Extraction log generated: %s", log_file_name)
+    return df
+
+
+def main(input_filename=input_filename, mapping_csv=mapping_csv, log_level=logging.INFO, workers=None,
+         output_format="xlsx", cache_dir=None, update_mapping=False, pipeline=False, profile=False,
+         profile_parse=False, trace_memory=False, quarantine=False, validate=False):
+    """Parse a cutoff text file and write the mapped rows as xlsx, parquet or csv.
+
+    With pipeline set, reading, parsing, mapping and writing overlap in
+    threaded stages and the output is written in batches.
+    """
+    logger.setLevel(log_level)
+    if pipeline:
+        from staged_pipeline import run_pipeline
+        run_pipeline(input_filename, load_institute_mapping(mapping_csv), output_format, profile=profile,
+                     profile_parse=profile_parse)
+        return
+    process_file(input_filename, load_institute_mapping(mapping_csv), output_format, workers=workers,
+                 cache_dir=cache_dir, update_mapping=mapping_csv if update_mapping else None, profile=profile,
+                 profile_parse=profile_parse, trace_memory=trace_memory, quarantine=quarantine,
+                 validate=validate)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Parse CAP cutoff text into an Excel sheet or data file.")
+    arg_parser.add_argument("input", nargs="?", default=input_filename, help="Cutoff text or PDF file to parse")
+    arg_parser.add_argument("--mapping", default=mapping_csv, help="Institute code/name mapping CSV")
+    arg_parser.add_argument("--log-level", default="INFO",
+                            choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                            help="Lowest level written to the extraction log")
+    arg_parser.add_argument("--workers", type=int, default=None,
+                            help="Parse institute blocks, or extract PDF pages, in this many processes")
+    arg_parser.add_argument("--format", dest="output_format", default="xlsx", choices=sorted(WRITERS),
+                            help="Output file format")
+    arg_parser.add_argument("--cache-dir", default=None,
+                            help="Reuse parsed institute blocks from this directory; only changed blocks are re-parsed")
+    arg_parser.add_argument("--update-mapping", action="store_true",
+                            help="Add institutes missing from the mapping CSV while parsing")
+    arg_parser.add_argument("--pipeline", action="store_true",
+                            help="Overlap reading, parsing, mapping and writing with bounded memory (text input only)")
+    arg_parser.add_argument("--quarantine", action="store_true",
+                            help="Parse each institute block on its own and set failing blocks aside in "
+                                 "<name>_quarantine.txt (text input only)")
+    arg_parser.add_argument("--validate", action="store_true",
+                            help="Check stage category counts, stage order and percentiles and write the "
+                                 "issues to <name>_validation.<ext>")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="Write wall time, CPU time and peak memory per stage to <name>_profile.json")
+    arg_parser.add_argument("--profile-parse", action="store_true",
+                            help="Dump cProfile stats of the parse stage to <name>_parse.prof")
+    arg_parser.add_argument("--trace-memory", action="store_true",
+                            help="With --profile, also record tracemalloc peaks per stage (slower)")
+    args = arg_parser.parse_args()
+    configure_logging()
+    if args.pipeline and (args.workers or args.cache_dir or args.update_mapping or args.validate
+                          or args.input.lower().endswith(".pdf")):
+        arg_parser.error("--pipeline reads text input and cannot be combined with --workers, --cache-dir, "
+                         "--update-mapping or --validate")
+    if args.quarantine and (args.pipeline or args.workers or args.cache_dir or args.input.lower().endswith(".pdf")):
+        arg_parser.error("--quarantine reads text input and cannot be combined with --pipeline, --workers "
+                         "or --cache-dir")
+    main(args.input, args.mapping, args.log_level, args.workers, args.output_format, args.cache_dir,
+         args.update_mapping, args.pipeline, args.profile, args.profile_parse, args.trace_memory, args.quarantine,
+         args.validate)
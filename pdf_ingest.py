@@ -0,0 +1,148 @@
+"""Read CAP cutoff PDFs straight into the parser.
+
+Pages are extracted in a process pool and streamed to CutoffParser in page
+order, so no intermediate text file is written. Each page is cropped the
+way the trimmed text dumps are: the page header above the first institute,
+branch or table line and everything from the legends and page number down
+are left out. Stage tables are read cell by cell, row by row: an empty cell
+becomes a blank line and a cell with a line break ("I-Non" / "PWD", "7574" /
+"(97.4656463)") becomes several lines, the same layout as the text dumps.
+Text outside the tables is read line by line. Needs pdfplumber (pip install
+pdfplumber), which is only imported when a PDF is read.
+"""
+import os
+import re
+from collections import deque
+from multiprocessing.util import Finalize
+from concurrent.futures import ProcessPoolExecutor
+
+from parse_admission_cutoffs_corrected import LINE_BLANK, LINE_TEXT, CutoffParser, classify_line, logger
+
+# Page header lines; the cropped text dumps start below them
+page_header_pattern = re.compile(r"Government of Maharashtra|State Common Entrance Test Cell|Cut Off List for")
+# The legends block at the foot of a page; the dumps stop above it
+page_footer_pattern = re.compile(r"Legends\s*:|\* Maharashtra State Seats|Legends for ChoiceCode")
+
+# Pages handed to a worker at a time
+PAGES_PER_TASK = 4
+# Tasks queued per worker, so extracted pages waiting for the parser stay bounded
+TASKS_PER_WORKER = 2
+
+
+def _import_pdfplumber():
+    try:
+        import pdfplumber
+    except ImportError as e:
+        raise ImportError("Reading PDF input needs pdfplumber: pip install pdfplumber") from e
+    return pdfplumber
+
+
+def page_body(lines, tables, page_height, page_number):
+    """Return (top, bottom) of the part of a page that the text dumps keep.
+
+    lines are the text lines outside the tables, in reading order. The body
+    starts at the first table or parser line (institute, branch, status,
+    seat, stage, category or rank) below the page header, so header lines
+    that wrap are cropped too, and ends above the legends or, without
+    them, above the page number printed alone on the last line.
+    """
+    floor = max((line["bottom"] for line in lines if page_header_pattern.match(line["text"].strip())), default=0)
+    starts = [table.bbox[1] for table in tables if table.bbox[1] >= floor]
+    starts += [line["top"] for line in lines
+               if line["top"] >= floor and classify_line(line["text"].strip())[0] not in (LINE_TEXT, LINE_BLANK)]
+    top = min(starts, default=floor)
+    ends = [line["top"] for line in lines if line["top"] > top and page_footer_pattern.match(line["text"].strip())]
+    if lines and lines[-1]["text"].strip() == str(page_number) and lines[-1]["top"] > top:
+        ends.append(lines[-1]["top"])
+    return top, min(ends, default=page_height)
+
+
+def table_lines(rows):
+    """Flatten extracted table rows into text lines, one or more per cell."""
+    lines = []
+    for row in rows:
+        for cell in row:
+            lines.extend(cell.splitlines() if cell else [""])
+    return lines
+
+
+def extract_page(pdf, index):
+    """Return the cropped text lines of one page of an open pdfplumber document."""
+    page = pdf.pages[index]
+    try:
+        tables = page.find_tables()
+        outside = page
+        for table in tables:
+            # Tables that run off the page edge are cut at the edge
+            outside = outside.outside_bbox(table.bbox, strict=False)
+        lines = outside.extract_text_lines(return_chars=False)
+        top, bottom = page_body(lines, tables, page.height, index + 1)
+        # (top of the item, its lines), merged into reading order
+        items = [(line["top"], [line["text"]]) for line in lines if top <= line["top"] < bottom]
+        items += [(table.bbox[1], table_lines(table.extract())) for table in tables if top <= table.bbox[1] < bottom]
+        items.sort(key=lambda item: item[0])
+        return [line for _, item_lines in items for line in item_lines]
+    finally:
+        # Drop the page's parsed objects; pdfplumber keeps them for the life of the document otherwise
+        page.close()
+
+
+# The document opened once by each worker process
+_worker_pdf = None
+
+
+def _open_in_worker(path):
+    global _worker_pdf
+    _worker_pdf = _import_pdfplumber().open(path)
+    # atexit handlers do not run in pool workers; multiprocessing finalizers do
+    Finalize(None, _worker_pdf.close, exitpriority=0)
+
+
+def _extract_in_worker(start, stop):
+    return [(index + 1, extract_page(_worker_pdf, index)) for index in range(start, stop)]
+
+
+def iter_pdf_pages(path, workers=None):
+    """Yield (page number, lines) for every page of a PDF, in page order.
+
+    Pages go to the workers PAGES_PER_TASK at a time, with at most
+    TASKS_PER_WORKER tasks per worker queued or waiting to be read, so
+    memory stays bounded however many pages the PDF has.
+    """
+    pdfplumber = _import_pdfplumber()
+    workers = workers or os.cpu_count() or 1
+    with pdfplumber.open(path) as pdf:
+        page_count = len(pdf.pages)
+        logger.info("Extracting %s pages from %s with %s workers", page_count, path, workers)
+        if workers == 1:
+            for index in range(page_count):
+                yield index + 1, extract_page(pdf, index)
+            return
+
+    with ProcessPoolExecutor(workers, initializer=_open_in_worker, initargs=(path,)) as pool:
+        pending = deque()
+        for start in range(0, page_count, PAGES_PER_TASK):
+            if len(pending) == workers * TASKS_PER_WORKER:
+                # Hand over the oldest task's pages before queuing another
+                yield from pending.popleft().result()
+            pending.append(pool.submit(_extract_in_worker, start, min(start + PAGES_PER_TASK, page_count)))
+        while pending:
+            yield from pending.popleft().result()
+
+
+class PdfCutoffParser:
+    """Parse a cutoff PDF, extracting its pages in parallel.
+
+    Rows carry the number of the page they were read from, and overflow
+    columns are only attached to stage tables on the same or previous page.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers
+        self.parser = CutoffParser()
+        self.stats = self.parser.stats
+        self.institutes = self.parser.institutes
+
+    def iter_rows(self, path):
+        """Yield parsed rows from the PDF at path, in page order."""
+        yield from self.parser.parse_pages(iter_pdf_pages(path, self.workers))
@@ -0,0 +1,108 @@
+"""Parse a cutoff file institute block by institute block, setting failing blocks aside.
+
+    python parse_admission_cutoffs_corrected.py documents/2024ENGG_CAP2_CutOff.txt --quarantine
+    python parse_admission_cutoffs_corrected.py 2024ENGG_CAP2_CutOff_quarantine.txt
+
+Each institute block is parsed by a fresh CutoffParser inside its own error
+boundary, and its rows are held back until the whole block has parsed. A
+block that raises, or that has malformed or out-of-range ranks or overflow
+columns that could not be placed, is dropped from the output. Its raw text
+goes to <name>_quarantine.txt, and <name>_quarantine.json records where
+each block came from. The other blocks are kept. The quarantine file is an
+ordinary cutoff text file, so once fixed it can be parsed on its own.
+"""
+import os
+import json
+
+from block_cache import block_label, split_blocks
+from cutoff_reader import MappedTextFile, count_lines
+from cutoff_writers import atomic_path
+from parse_admission_cutoffs_corrected import CutoffParser, logger
+
+# Parser counters that send a block to quarantine
+QUARANTINE_EVENTS = ("malformed_ranks", "out_of_range_ranks", "overflow_fragments_unplaced")
+
+
+def manifest_file(quarantine_file):
+    """Return the path of the JSON manifest kept next to a quarantine text file."""
+    return os.path.splitext(quarantine_file)[0] + ".json"
+
+
+class QuarantiningCutoffParser:
+    """Parse a cutoff text file, quarantining the institute blocks that fail.
+
+    stats and institutes cover the blocks that were kept; quarantined lists
+    a manifest entry per block that was set aside. Parser state is reset at
+    every institute header, so the kept rows are the same as those of a
+    single CutoffParser run over the same blocks.
+    """
+
+    def __init__(self, quarantine_file):
+        self.quarantine_file = quarantine_file
+        self.stats = CutoffParser().stats
+        self.institutes = {}
+        self.quarantined = []
+
+    def _parse_block(self, text_file, start, end, first_line):
+        """Return (rows, parser, reason); reason is None if the block parsed cleanly."""
+        parser = CutoffParser()
+        try:
+            rows = list(parser.parse_lines(text_file.iter_lines(start, end), first_line))
+        except Exception as e:
+            return [], parser, f"{type(e).__name__}: {e}"
+        events = {name: parser.stats[name] for name in QUARANTINE_EVENTS if parser.stats[name]}
+        if events:
+            return rows, parser, ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in events.items())
+        return rows, parser, None
+
+    def iter_rows(self, path):
+        """Yield the rows of every block that parsed cleanly, then write the quarantine files."""
+        self.quarantined = []
+        blocks = []
+        quarantine_line = 1
+        with MappedTextFile(path) as text_file:
+            first_line = 1
+            for start, end in split_blocks(text_file):
+                data = text_file.read(start, end)
+                breaks = count_lines(data)
+                rows, parser, reason = self._parse_block(text_file, start, end, first_line)
+                if reason is None:
+                    for name, value in parser.stats.items():
+                        self.stats[name] += value
+                    for code, name in parser.institutes.items():
+                        self.institutes.setdefault(code, name)
+                    yield from rows
+                else:
+                    # Only the last block of a file can lack a final line break
+                    if not data.endswith((b"\n", b"\r")):
+                        data += b"\n"
+                    lines = count_lines(data)
+                    label = block_label(data)
+                    logger.error("Quarantined lines %s-%s (%s): %s", first_line, first_line + lines - 1, label, reason)
+                    blocks.append(data)
+                    self.quarantined.append({
+                        "block": label,
+                        "reason": reason,
+                        "first_line": first_line,
+                        "last_line": first_line + lines - 1,
+                        "start_offset": start,
+                        "end_offset": end,
+                        "quarantine_first_line": quarantine_line,
+                    })
+                    quarantine_line += lines
+                first_line += breaks
+        self._write(path, blocks)
+
+    def _write(self, path, blocks):
+        """Write the quarantined blocks and their manifest, or remove those of an earlier run."""
+        manifest = manifest_file(self.quarantine_file)
+        if not blocks:
+            for stale in (self.quarantine_file, manifest):
+                if os.path.exists(stale):
+                    os.remove(stale)
+            return
+        with atomic_path(self.quarantine_file) as temp_name, open(temp_name, "wb") as file:
+            file.writelines(blocks)
+        with atomic_path(manifest) as temp_name, open(temp_name, "w", encoding="utf-8") as file:
+            json.dump({"source": path, "blocks": self.quarantined}, file, indent=2)
+        logger.warning("Quarantined %s institute blocks to %s", len(blocks), self.quarantine_file)
@@ -0,0 +1,227 @@
+"""Compare the cutoffs of two parsed CAP rounds.
+
+    python round_diff.py 2024ENGG_CAP1_cutoffs_output.parquet 2024ENGG_CAP2_cutoffs_output.parquet --format csv
+    python cet_cutoffs.py diff 2024ENGG_CAP1_cutoffs_output.csv 2024ENGG_CAP2_cutoffs_output.csv
+
+Rows are joined on (Branch Code, Seat Description, Stage, Category). The old
+round is read once into a hash table of 64-bit key hashes with its ranks and
+percentiles; the new round is streamed through it in chunks, and a last
+pass over the old round picks up the seats that were removed. The diff
+rows of each chunk are written out as soon as they are found, so only that
+table, one chunk and the per-institute summary are held in memory at a
+time.
+
+Two files are written: <name>_diff with one row per seat whose rank or
+percentile moved, or that was added or removed, and <name>_diff_summary
+with the counts and mean deltas per institute.
+"""
+import os
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from cutoff_writers import STREAM_WRITERS, WRITERS, atomic_path, iter_output_chunks
+
+logger = logging.getLogger("cutoffs")
+
+KEY_COLUMNS = ["Branch Code", "Seat Description", "Stage", "Category"]
+
+# Output rows read and joined at a time
+CHUNK_ROWS = 200000
+
+CHANGE_ADDED = "added"
+CHANGE_REMOVED = "removed"
+CHANGE_CHANGED = "changed"
+CHANGE_UNCHANGED = "unchanged"  # Never written to the diff
+
+SUMMARY_COLUMNS = ["Seats Compared", "Changed", "Added", "Removed", "Rank Delta Sum", "Rank Deltas",
+                   "Percentile Delta Sum", "Percentile Deltas"]
+
+
+def key_hashes(chunk):
+    """Hash the join key of every row to a uint64."""
+    return pd.util.hash_pandas_object(chunk[KEY_COLUMNS].astype(str), index=False).to_numpy()
+
+
+def _values(chunk, column):
+    return pd.to_numeric(chunk[column]).to_numpy(np.float64, na_value=np.nan)
+
+
+def _institutes(chunk):
+    """Return the institute code (as in the mapping CSV) and name of every row."""
+    codes = chunk["Branch Code"].astype(str).str[:5].str.lstrip("0")
+    names = chunk["Institute Name"].astype(str) if "Institute Name" in chunk else pd.Series("", index=chunk.index)
+    return codes.to_numpy(object), names.to_numpy(object)
+
+
+class _OldRound:
+    """The old round as unique key hashes, their ranks and percentiles, and a matched flag each."""
+
+    def __init__(self, output_file, chunk_rows):
+        hashes, ranks, percentiles = [], [], []
+        for chunk in iter_output_chunks(output_file, chunk_rows):
+            hashes.append(key_hashes(chunk))
+            ranks.append(_values(chunk, "Rank"))
+            percentiles.append(_values(chunk, "Percentile"))
+        hashes = np.concatenate(hashes) if hashes else np.empty(0, np.uint64)
+        # A key listed twice keeps its last row, as a later page overrides an earlier one
+        unique = ~pd.Index(hashes).duplicated(keep="last")
+        self.index = pd.Index(hashes[unique])
+        self.ranks = np.concatenate(ranks)[unique] if ranks else np.empty(0)
+        self.percentiles = np.concatenate(percentiles)[unique] if percentiles else np.empty(0)
+        self.matched = np.zeros(len(self.index), dtype=bool)
+
+    def __len__(self):
+        return len(self.index)
+
+
+def _frame(chunk, change, old_ranks, new_ranks, old_percentiles, new_percentiles):
+    codes, names = _institutes(chunk)
+    frame = pd.DataFrame({"Institute Code": codes, "Institute Name": names})
+    for column in KEY_COLUMNS:
+        frame[column] = chunk[column].astype(str).to_numpy(object)
+    frame["Change"] = change
+    frame["Old Rank"] = old_ranks
+    frame["New Rank"] = new_ranks
+    frame["Rank Delta"] = new_ranks - old_ranks
+    frame["Old Percentile"] = old_percentiles
+    frame["New Percentile"] = new_percentiles
+    frame["Percentile Delta"] = new_percentiles - old_percentiles
+    return frame
+
+
+def _summarize(frame, compared):
+    """Return per-institute counts and delta sums of one chunk's diff rows."""
+    deltas = frame["Rank Delta"]
+    percentile_deltas = frame["Percentile Delta"]
+    return pd.DataFrame({
+        "Institute Code": frame["Institute Code"],
+        "Institute Name": frame["Institute Name"],
+        "Seats Compared": compared,
+        "Changed": frame["Change"] == CHANGE_CHANGED,
+        "Added": frame["Change"] == CHANGE_ADDED,
+        "Removed": frame["Change"] == CHANGE_REMOVED,
+        "Rank Delta Sum": deltas.fillna(0),
+        "Rank Deltas": deltas.notna(),
+        "Percentile Delta Sum": percentile_deltas.fillna(0),
+        "Percentile Deltas": percentile_deltas.notna(),
+    }).groupby(["Institute Code", "Institute Name"], sort=False)[SUMMARY_COLUMNS].sum()
+
+
+def _add_summary(summary, frame, compared):
+    """Fold the per-institute counts of one chunk's diff rows into the running summary."""
+    return pd.concat([summary, _summarize(frame, compared)]).groupby(level=[0, 1], sort=False).sum()
+
+
+def diff_rounds(old_file, new_file, write, chunk_rows=CHUNK_ROWS):
+    """Compare two parsed output files of the same seat matrix and return the per-institute summary.
+
+    The added, removed and changed seats are passed to write one frame at a
+    time, as each chunk is joined. The summary has one row per institute
+    with the seats compared, the change counts and the mean rank and
+    percentile deltas of the seats present in both rounds.
+    """
+    old = _OldRound(old_file, chunk_rows)
+    logger.info("Loaded %s seats of %s", len(old), old_file)
+    empty_diff = _frame(pd.DataFrame(columns=KEY_COLUMNS), CHANGE_CHANGED, *[np.empty(0)] * 4)
+    summary = _summarize(empty_diff, 0)
+    new_seats = 0
+    written = 0
+
+    for chunk in iter_output_chunks(new_file, chunk_rows):
+        new_seats += len(chunk)
+        positions = old.index.get_indexer(key_hashes(chunk))
+        found = positions >= 0
+        old.matched[positions[found]] = True
+        old_ranks = np.where(found, old.ranks[positions], np.nan)
+        old_percentiles = np.where(found, old.percentiles[positions], np.nan)
+        new_ranks = _values(chunk, "Rank")
+        new_percentiles = _values(chunk, "Percentile")
+        # NaN == NaN is False, so compare missing values explicitly
+        same = found & ((old_ranks == new_ranks) | (np.isnan(old_ranks) & np.isnan(new_ranks))) & (
+            (old_percentiles == new_percentiles) | (np.isnan(old_percentiles) & np.isnan(new_percentiles)))
+        change = np.where(found, np.where(same, CHANGE_UNCHANGED, CHANGE_CHANGED), CHANGE_ADDED)
+        frame = _frame(chunk, change, old_ranks, new_ranks, old_percentiles, new_percentiles)
+        summary = _add_summary(summary, frame, found)
+        if not same.all():
+            write(frame[~same])
+            written += 1
+
+    # Seats of the old round the new one never matched
+    for chunk in iter_output_chunks(old_file, chunk_rows):
+        hashes = key_hashes(chunk)
+        first = ~pd.Index(hashes).duplicated(keep="last")
+        positions = old.index.get_indexer(hashes)
+        gone = first & ~old.matched[positions]
+        if not gone.any():
+            continue
+        old.matched[positions[gone]] = True
+        chunk = chunk[gone]
+        empty = np.full(len(chunk), np.nan)
+        frame = _frame(chunk, CHANGE_REMOVED, _values(chunk, "Rank"), empty, _values(chunk, "Percentile"), empty)
+        summary = _add_summary(summary, frame, 0)
+        write(frame)
+        written += 1
+    # The diff output gets its columns even when nothing differs
+    if not written:
+        write(empty_diff)
+
+    logger.info("Diff %s -> %s: %s seats in the new round, %s changed, %s added, %s removed",
+                old_file, new_file, new_seats, summary["Changed"].sum(), summary["Added"].sum(),
+                summary["Removed"].sum())
+    summary["Mean Rank Delta"] = summary.pop("Rank Delta Sum") / summary.pop("Rank Deltas").replace(0, np.nan)
+    summary["Mean Percentile Delta"] = (summary.pop("Percentile Delta Sum")
+                                        / summary.pop("Percentile Deltas").replace(0, np.nan))
+    return summary.reset_index().sort_values(
+        "Institute Code", key=lambda codes: pd.to_numeric(codes, errors="coerce"), kind="stable", ignore_index=True)
+
+
+def write_diff(old_file, new_file, name, output_format="csv", output_dir=".", chunk_rows=CHUNK_ROWS):
+    """Diff two rounds into <name>_diff and <name>_diff_summary in the given format; return both paths.
+
+    The diff rows are streamed to their file as they are found.
+    """
+    extension = WRITERS[output_format][1]
+    diff_file = os.path.join(output_dir, f"{name}_diff.{extension}")
+    with atomic_path(diff_file) as temp_name:
+        writer = STREAM_WRITERS[output_format](temp_name)
+        try:
+            summary = diff_rounds(old_file, new_file, writer.write, chunk_rows)
+        finally:
+            writer.close()
+    logger.info("%s file generated: %s", output_format, diff_file)
+
+    summary_file = os.path.join(output_dir, f"{name}_diff_summary.{extension}")
+    with atomic_path(summary_file) as temp_name:
+        WRITERS[output_format][0](summary, temp_name)
+    logger.info("%s file generated: %s", output_format, summary_file)
+    return [diff_file, summary_file]
+
+
+def _base_name(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name[:-len("_cutoffs_output")] if name.endswith("_cutoffs_output") else name
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="cet-cutoffs diff", description="Compare the cutoffs of two CAP rounds.")
+    arg_parser.add_argument("old", help="Output file of the earlier round (.parquet, .csv or .xlsx)")
+    arg_parser.add_argument("new", help="Output file of the later round")
+    arg_parser.add_argument("--format", dest="output_format", default="csv", choices=sorted(WRITERS),
+                            help="Format of the diff and summary files")
+    arg_parser.add_argument("--output-dir", default=".", help="Directory for the diff and summary files")
+    arg_parser.add_argument("--name", default=None, help="Base name of the outputs (default <old>_vs_<new>)")
+    arg_parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows read and joined at a time")
+    args = arg_parser.parse_args(argv)
+
+    name = args.name or f"{_base_name(args.old)}_vs_{_base_name(args.new)}"
+    os.makedirs(args.output_dir, exist_ok=True)
+    write_diff(args.old, args.new, name, args.output_format, args.output_dir, args.chunk_rows)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    raise SystemExit(main())
@@ -0,0 +1,104 @@
+from array import array
+from collections import namedtuple
+
+# One parsed cutoff. rank and percentile are None for a skipped category;
+# source_offset is the byte offset of the line the row came from and page its
+# PDF page number, each None when not known.
+CutoffRow = namedtuple("CutoffRow", [
+    "branch_code", "branch_name", "status", "seat_description", "stage",
+    "category", "rank", "percentile", "source_offset", "page",
+], defaults=[None])
+
+# DataFrame column for each CutoffRow field
+ROW_COLUMNS = [
+    "Branch Code", "Branch Name", "Status", "Seat Description", "Stage",
+    "Category", "Rank", "Percentile", "Source Offset", "Page",
+]
+
+# The leading CutoffRow fields that only change at branch, status, seat or stage lines
+CONTEXT_FIELDS = 5
+
+
+class RowStore:
+    """Columnar buffer for parsed cutoff rows.
+
+    The branch/status/seat/stage context and the category are stored as
+    integer codes into interned tables, and rank, percentile and offset in
+    typed arrays, so a row costs a few bytes instead of a dict.
+    to_frame() builds categorical columns straight from the codes.
+    """
+
+    def __init__(self):
+        self._context_ids = {}
+        self.contexts = []
+        self._category_ids = {}
+        self.categories = []
+        self.context_codes = array('I')
+        self.category_codes = array('H')
+        self.ranks = array('i')  # -1 for a skipped category
+        self.percentiles = array('d')  # NaN for a skipped category
+        self.offsets = array('q')  # -1 when the offset is unknown
+        self.pages = array('i')  # -1 when the page is unknown
+
+    def __len__(self):
+        return len(self.ranks)
+
+    def append(self, row):
+        """Add one CutoffRow to the store."""
+        context = row[:CONTEXT_FIELDS]
+        context_id = self._context_ids.get(context)
+        if context_id is None:
+            context_id = self._context_ids[context] = len(self.contexts)
+            self.contexts.append(context)
+        category_id = self._category_ids.get(row.category)
+        if category_id is None:
+            category_id = self._category_ids[row.category] = len(self.categories)
+            self.categories.append(row.category)
+        self.context_codes.append(context_id)
+        self.category_codes.append(category_id)
+        self.ranks.append(-1 if row.rank is None else row.rank)
+        self.percentiles.append(float("nan") if row.percentile is None else row.percentile)
+        self.offsets.append(-1 if row.source_offset is None else row.source_offset)
+        self.pages.append(-1 if row.page is None else row.page)
+
+    def extend(self, rows):
+        """Add every row from an iterable of CutoffRows."""
+        append = self.append
+        for row in rows:
+            append(row)
+
+    def __iter__(self):
+        """Yield the stored rows as CutoffRows, in insertion order."""
+        return self.iter_rows()
+
+    def iter_rows(self, offset_shift=0):
+        """Yield the stored rows as CutoffRows with offset_shift added to known offsets."""
+        for context_id, category_id, rank, percentile, offset, page in zip(
+                self.context_codes, self.category_codes, self.ranks, self.percentiles, self.offsets, self.pages):
+            yield CutoffRow(
+                *self.contexts[context_id], self.categories[category_id],
+                None if rank < 0 else rank,
+                None if percentile != percentile else percentile,
+                None if offset < 0 else offset + offset_shift,
+                None if page < 0 else page)
+
+    def to_frame(self):
+        """Return the rows as a DataFrame with categorical text columns."""
+        import numpy as np
+        import pandas as pd
+
+        context_codes = np.array(self.context_codes, dtype=np.intp)
+        columns = {}
+        for field, name in enumerate(ROW_COLUMNS[:CONTEXT_FIELDS]):
+            codes, values = pd.factorize(pd.Index([context[field] for context in self.contexts], dtype=object))
+            columns[name] = pd.Categorical.from_codes(codes[context_codes], categories=values)
+        columns["Category"] = pd.Categorical.from_codes(
+            np.array(self.category_codes, dtype=np.intp), categories=pd.Index(self.categories, dtype=object))
+        ranks = np.array(self.ranks, dtype=np.int32)
+        columns["Rank"] = pd.arrays.IntegerArray(ranks, ranks < 0)
+        columns["Percentile"] = np.array(self.percentiles, dtype=np.float64)
+        offsets = np.array(self.offsets, dtype=np.int64)
+        columns["Source Offset"] = pd.arrays.IntegerArray(offsets, offsets < 0)
+        pages = np.array(self.pages, dtype=np.int32)
+        columns["Page"] = pd.arrays.IntegerArray(pages, pages < 0)
+        return pd.DataFrame(columns)
@@ -0,0 +1,117 @@
+"""Wall time, CPU time and memory per pipeline stage, written as a JSON report.
+
+    python parse_admission_cutoffs_corrected.py input.txt --profile --profile-parse
+
+Every stage records its wall and CPU seconds and the process's peak RSS
+after it ran, with how much the stage raised it. Peak RSS comes from the
+Unix resource module; where that is missing (Windows) the RSS fields are
+null and the rest of the report is unchanged. With trace_memory the
+peak of Python allocations inside the stage is taken from tracemalloc as
+well; that slows the run down, so it is off by default.
+"""
+import sys
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from cutoff_writers import atomic_path
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Bump when the report layout changes
+REPORT_VERSION = 1
+
+
+def peak_rss_mib():
+    """Peak resident set size of this process so far, or None where it cannot be read.
+
+    ru_maxrss is in KiB on Linux and bytes on macOS.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageProfiler:
+    """Collect per-stage measurements; a disabled profiler measures nothing."""
+
+    def __init__(self, enabled=True, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.started = time.time()
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the code run inside the with block as one stage."""
+        if not self.enabled:
+            yield
+            return
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        rss_before = peak_rss_mib()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            entry = {
+                "stage": name,
+                "wall_seconds": time.perf_counter() - wall,
+                "cpu_seconds": time.process_time() - cpu,
+                "peak_rss_mib": peak_rss_mib(),
+            }
+            entry["peak_rss_growth_mib"] = None if rss_before is None else entry["peak_rss_mib"] - rss_before
+            if self.trace_memory:
+                entry["traced_peak_mib"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            self.stages.append(entry)
+
+    def add(self, name, **measurements):
+        """Record a stage measured elsewhere, e.g. by a threaded pipeline stage."""
+        if self.enabled:
+            self.stages.append({"stage": name, **measurements})
+
+    def report(self, **details):
+        """Return the report as a dict.
+
+        details (input file, row count, ...) are stored alongside and may
+        override total_wall_seconds, the sum of the stage wall times.
+        """
+        return {
+            "version": REPORT_VERSION,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "python": sys.version.split()[0],
+            "total_wall_seconds": sum(stage.get("wall_seconds", 0.0) for stage in self.stages),
+            **details,
+            "stages": self.stages,
+        }
+
+    def write_json(self, path, **details):
+        with atomic_path(path) as temp_name, open(temp_name, "w", encoding="utf-8") as file:
+            json.dump(self.report(**details), file, indent=2)
+        return path
+
+
+@contextmanager
+def profile_calls(stats_file):
+    """Run the with block under cProfile and dump its stats to stats_file; do nothing if stats_file is None."""
+    if stats_file is None:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        with atomic_path(stats_file) as temp_name:
+            profiler.dump_stats(temp_name)
@@ -0,0 +1,284 @@
+"""Run read, parse, map and write as overlapping stages with bounded queues.
+
+    python parse_admission_cutoffs_corrected.py documents/2024ENGG_CAP2_CutOff.txt --pipeline --format parquet
+
+Each stage runs in its own thread and hands batches to the next through a
+queue of QUEUE_BATCHES entries. A stage that gets ahead blocks on the full
+queue, so at most a few batches of lines, rows and mapped frames are held at
+once whatever the input size, and the output is written as batches arrive.
+Every stage reports its throughput and the time it spent waiting on its
+input and output queues.
+"""
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from cutoff_reader import MappedTextFile
+from cutoff_writers import STREAM_WRITERS, atomic_path, output_path
+from parse_admission_cutoffs_corrected import (
+    OUTPUT_COLUMNS, CutoffParser, apply_institute_mapping, log_institute_counts, log_summary, logger,
+    open_extraction_log,
+)
+from row_store import RowStore
+from stage_profiler import StageProfiler, peak_rss_mib, profile_calls
+
+# Lines per batch from the reader, and rows per batch from the parser
+LINES_PER_BATCH = 20000
+ROWS_PER_BATCH = 50000
+
+# Batches each queue holds before the stage feeding it blocks
+QUEUE_BATCHES = 4
+
+# How often a blocked stage checks whether the run was cancelled
+POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+class _Cancelled(Exception):
+    """Another stage failed; this one stops without reporting an error of its own."""
+
+
+class StageStats:
+    """Work and wait times of one stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.batches = 0
+        self.items = 0  # Lines for the reader, rows for the other stages
+        self.seconds = 0.0  # Wall time from start to finish
+        self.cpu_seconds = 0.0  # CPU time of the stage's thread
+        self.input_wait = 0.0
+        self.output_wait = 0.0
+
+    def as_dict(self):
+        busy = self.seconds - self.input_wait - self.output_wait
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "seconds": self.seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "busy_seconds": busy,
+            "input_wait_seconds": self.input_wait,
+            "output_wait_seconds": self.output_wait,
+            "items_per_second": self.items / self.seconds if self.seconds else 0.0,
+        }
+
+
+class _Channel:
+    """A bounded queue between two stages that gives up when the run is cancelled."""
+
+    def __init__(self, cancelled):
+        self.queue = queue.Queue(QUEUE_BATCHES)
+        self.cancelled = cancelled
+
+    def put(self, item, stats):
+        start = time.perf_counter()
+        while True:
+            try:
+                self.queue.put(item, timeout=POLL_SECONDS)
+                break
+            except queue.Full:
+                if self.cancelled.is_set():
+                    raise _Cancelled()
+        stats.output_wait += time.perf_counter() - start
+
+    def __call__(self, stats):
+        """Yield items until the sending stage is done."""
+        while True:
+            start = time.perf_counter()
+            while True:
+                try:
+                    item = self.queue.get(timeout=POLL_SECONDS)
+                    break
+                except queue.Empty:
+                    if self.cancelled.is_set():
+                        raise _Cancelled()
+            stats.input_wait += time.perf_counter() - start
+            if item is _DONE:
+                return
+            yield item
+
+
+class StagedPipeline:
+    """Parse one cutoff text file into an output file through four threaded stages.
+
+    stages holds a StageStats per stage after run(); stats, missing_counts
+    and institute_counts are the parser, per-category missing-rank and
+    institute mapping totals.
+    """
+
+    def __init__(self, institute_mapping, output_format="xlsx", output_dir=".", parse_stats_file=None):
+        self.institute_mapping = institute_mapping
+        self.output_format = output_format
+        self.output_dir = output_dir
+        self.parse_stats_file = parse_stats_file  # cProfile stats of the parse thread, when set
+        self.parser = CutoffParser()
+        self.stats = self.parser.stats
+        self.missing_counts = Counter()
+        self.institute_counts = None
+        self.stages = [StageStats(name) for name in ("read", "parse", "map", "write")]
+
+    def _read(self, path, out, stats):
+        with MappedTextFile(path) as text_file:
+            batch = []
+            for pair in text_file.iter_lines():
+                batch.append(pair)
+                if len(batch) == LINES_PER_BATCH:
+                    stats.batches += 1
+                    stats.items += len(batch)
+                    out.put(batch, stats)
+                    batch = []
+            if batch:
+                stats.batches += 1
+                stats.items += len(batch)
+                out.put(batch, stats)
+
+    def _parse(self, source, out, stats):
+        def lines():
+            for batch in source(stats):
+                yield from batch
+
+        store = RowStore()
+        with profile_calls(self.parse_stats_file):
+            for row in self.parser.parse_lines(lines()):
+                store.append(row)
+                if len(store) == ROWS_PER_BATCH:
+                    stats.batches += 1
+                    stats.items += len(store)
+                    out.put(store, stats)
+                    store = RowStore()
+        if len(store):
+            stats.batches += 1
+            stats.items += len(store)
+            out.put(store, stats)
+
+    def _map(self, source, out, stats):
+        for store in source(stats):
+            df = store.to_frame()
+            counts = apply_institute_mapping(df, self.institute_mapping, log_counts=False)
+            if counts is not None:
+                self.institute_counts = counts if self.institute_counts is None else \
+                    self.institute_counts.add(counts, fill_value=0).astype(int)
+            # Every category is listed in the report, also those with no missing ranks
+            self.missing_counts.update(dict.fromkeys(df['Category'].unique(), 0))
+            self.missing_counts.update(df.loc[df['Rank'].isna(), 'Category'])
+            df['Branch Code'] = df['Branch Code'].cat.rename_categories(lambda code: str(code).zfill(10))
+            stats.batches += 1
+            stats.items += len(df)
+            out.put(df[OUTPUT_COLUMNS], stats)
+
+    def _write(self, source, output_file, stats):
+        writer = STREAM_WRITERS[self.output_format](output_file)
+        try:
+            for df in source(stats):
+                writer.write(df)
+                stats.batches += 1
+                stats.items += len(df)
+        finally:
+            writer.close()
+
+    def run(self, path):
+        """Parse the file at path and write its output; return the output path.
+
+        The output is streamed to a temporary file that replaces the output
+        once every stage has finished. An error in any stage cancels the
+        others and is raised here, leaving an earlier output untouched.
+        """
+        base_name = os.path.splitext(os.path.basename(path))[0]
+        output_file = output_path(base_name, self.output_format, self.output_dir)
+        cancelled = threading.Event()
+        lines, rows, frames = _Channel(cancelled), _Channel(cancelled), _Channel(cancelled)
+        read, parse, map_, write = self.stages
+        errors = []
+
+        def stage(stats, work, *args, out=None):
+            start = time.perf_counter()
+            cpu = time.thread_time()
+            try:
+                work(*args, stats)
+                if out is not None:
+                    out.put(_DONE, stats)
+            except _Cancelled:
+                pass
+            except BaseException as e:
+                errors.append(e)
+                cancelled.set()
+            finally:
+                stats.seconds = time.perf_counter() - start
+                stats.cpu_seconds = time.thread_time() - cpu
+
+        with atomic_path(output_file) as temp_name:
+            threads = [
+                threading.Thread(target=stage, args=(read, self._read, path, lines), kwargs={"out": lines}),
+                threading.Thread(target=stage, args=(parse, self._parse, lines, rows), kwargs={"out": rows}),
+                threading.Thread(target=stage, args=(map_, self._map, rows, frames), kwargs={"out": frames}),
+                threading.Thread(target=stage, args=(write, self._write, frames, temp_name)),
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise errors[0]
+        return output_file
+
+    def log_report(self):
+        """Write the per-stage throughput and queue waits to the extraction log."""
+        for stats in self.stages:
+            report = stats.as_dict()
+            logger.info("Stage %s: %s items in %s batches, %.2f s (%.2f s busy, %.2f s waiting for input, "
+                        "%.2f s waiting for output), %.0f items/s",
+                        stats.name, report["items"], report["batches"], report["seconds"],
+                        report["busy_seconds"], report["input_wait_seconds"], report["output_wait_seconds"],
+                        report["items_per_second"])
+
+
+def run_pipeline(input_filename, institute_mapping, output_format="xlsx", output_dir=".", profile=False,
+                 profile_parse=False):
+    """Parse one cutoff text file through a StagedPipeline, with its own extraction log.
+
+    Returns the pipeline, whose stages hold the per-stage report, or None
+    if the file could not be processed. profile and profile_parse write the
+    same <name>_profile.json and <name>_parse.prof as process_file.
+    """
+    input_base_name = os.path.splitext(os.path.basename(input_filename))[0]
+    log_file_name = os.path.join(output_dir, f"{input_base_name}_extraction_log.txt")
+    log_handler = open_extraction_log(log_file_name)
+    parse_stats_file = os.path.join(output_dir, f"{input_base_name}_parse.prof") if profile_parse else None
+    pipeline = StagedPipeline(institute_mapping, output_format, output_dir, parse_stats_file)
+    try:
+        output_file = pipeline.run(input_filename)
+        if pipeline.institute_counts is not None:
+            log_institute_counts(pipeline.institute_counts)
+        for category, missing in pipeline.missing_counts.items():
+            logger.info("Category %s: %s missing values", category, missing)
+        if not pipeline.stats["total_rows"]:
+            logger.warning("DataFrame is empty, no data was parsed")
+        log_summary(pipeline.stats)
+        pipeline.log_report()
+        logger.info("%s file generated: %s", output_format, output_file)
+        if profile:
+            # The stages overlap, so the run's wall time is that of its longest stage
+            profiler = StageProfiler()
+            for stats in pipeline.stages:
+                report = stats.as_dict()
+                report["wall_seconds"] = report.pop("seconds")
+                profiler.add(stats.name, **report)
+            profiler.write_json(
+                os.path.join(output_dir, f"{input_base_name}_profile.json"),
+                input_file=input_filename, output_file=output_file, output_format=output_format,
+                parser="StagedPipeline", rows=pipeline.stats["total_rows"], parse_stats_file=parse_stats_file,
+                peak_rss_mib=peak_rss_mib(), total_wall_seconds=max(stats.seconds for stats in pipeline.stages))
+    except FileNotFoundError:
+        pipeline = None
+        logger.error("Data file '%s' not found. Please ensure the file exists in the same directory as the script.", input_filename)
+    except Exception as e:
+        pipeline = None
+        logger.error("An error occurred: %s", e)
+    finally:
+        logger.removeHandler(log_handler)
+        log_handler.close()
+    return pipeline
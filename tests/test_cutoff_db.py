@@ -0,0 +1,40 @@
+import sqlite3
+
+import pandas as pd
+
+import cutoff_db
+from cutoff_writers import write_output
+from parse_admission_cutoffs_corrected import OUTPUT_COLUMNS
+
+
+def _output(branch_codes, rank):
+    return pd.DataFrame([
+        ["1002", "Government College of Engineering, Amravati", "Amravati", code, "Civil Engineering",
+         "Government Autonomous", "State Level", "I", "GOPENS", rank, 90.5]
+        for code in branch_codes
+    ], columns=OUTPUT_COLUMNS)
+
+
+def _cutoffs(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        return dict(connection.execute(
+            "SELECT branch_code, rank FROM cutoffs JOIN branches USING (branch_id) ORDER BY branch_code"))
+    finally:
+        connection.close()
+
+
+def test_files_of_one_round_are_all_loaded(tmp_path):
+    first = write_output(_output(["0100219110", "0100224210"], 1000), "2024ENGG_CAP3_CutOff_cropped_1", "csv",
+                         str(tmp_path))
+    second = write_output(_output(["0110519110"], 2000), "2024ENGG_CAP3_CutOff_cropped_2", "csv", str(tmp_path))
+    db_path = str(tmp_path / "cutoffs.sqlite")
+    mapping = str(tmp_path / "missing_mapping.csv")
+
+    cutoff_db.main([db_path, first, second, "--mapping", mapping])
+    assert _cutoffs(db_path) == {"0100219110": 1000, "0100224210": 1000, "0110519110": 2000}
+
+    # A later run replaces the whole round, dropping seats that are gone
+    reparsed = write_output(_output(["0100219110"], 1500), "2024ENGG_CAP3_CutOff_cropped_1", "csv", str(tmp_path))
+    cutoff_db.main([db_path, reparsed, "--mapping", mapping])
+    assert _cutoffs(db_path) == {"0100219110": 1500}
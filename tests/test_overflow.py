@@ -0,0 +1,29 @@
+import os
+
+from parse_admission_cutoffs_corrected import CutoffParser
+
+DOCUMENTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "documents")
+
+
+def _parse(path):
+    parser = CutoffParser()
+    rows = [row[:8] for row in parser.iter_rows(path)]
+    return rows, parser.stats
+
+
+def test_split_rank_inside_overflow_fragment(tmp_path):
+    source = os.path.join(DOCUMENTS, "round2_overflow_pages.txt")
+    with open(source, "rb") as file:
+        data = file.read()
+    # The TFWS and EWS ranks of the overflow fragment, each split into a rank line and a score line
+    for rank, score in ((b"87619", b"(67.6869909)"), (b"169113", b"(13.2387508)")):
+        assert data.count(rank + b" " + score) == 1
+        data = data.replace(rank + b" " + score, rank + b"\r" + score)
+    split_file = tmp_path / "round2_overflow_split.txt"
+    split_file.write_bytes(data)
+
+    expected, _ = _parse(source)
+    rows, stats = _parse(str(split_file))
+    assert rows == expected
+    assert stats["out_of_range_ranks"] == 0
+    assert stats["overflow_fragments_reattached"] == 1
@@ -0,0 +1,297 @@
+"""Watch a directory and parse CAP round files as they arrive or change.
+
+    python cet_cutoffs.py watch documents/ --output-dir outputs --format parquet --jobs 4
+    python watch_folder.py documents/ --once
+
+The directory is polled every --interval seconds for .txt and .pdf files. A
+file is queued once its size and mtime stayed the same for one whole
+interval, so a file still being copied in is not parsed half written, and
+it is queued again whenever it changes. Files are parsed by a pool of
+--jobs processes that is kept for the life of the watcher, so each worker
+imports pandas and the parser only once. The mapping CSV is compiled once
+(see institute_mapping.py) and reloaded when it changes. Outputs are
+written through write_output, which renames a complete file into place.
+
+The watcher state is written to <output-dir>/watch_status.json after every
+poll: queue depth, running files, and per file its rows, parse seconds,
+latency from detection to output, and rows per second. On start the status
+file is read back, so files already parsed in their current form are not
+parsed again. SIGINT or SIGTERM lets the running files finish and exits.
+"""
+import os
+import json
+import time
+import signal
+import argparse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cet_cutoffs import is_round_file
+from cutoff_writers import WRITERS, atomic_path, output_path
+from parse_admission_cutoffs_corrected import (
+    configure_logging, load_institute_mapping, logger, mapping_csv, process_file,
+)
+
+# Bump when the status file layout changes; older status files are ignored
+STATUS_VERSION = "1"
+
+
+def file_signature(path):
+    """Return (size, mtime_ns) of a file, or None if it is gone."""
+    try:
+        status = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return status.st_size, status.st_mtime_ns
+
+
+def _timestamp(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(seconds))
+
+
+def _init_worker(log_level):
+    # The watcher drains running files on Ctrl+C; workers must not die of it first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    logger.setLevel(log_level)
+    # Pay for the heavy imports once per worker, not on the first file; the
+    # import is only for its side effect of loading the modules
+    import pandas  # noqa: F401
+
+
+def _process_in_worker(path, institute_mapping, output_format, output_dir, quarantine, validate):
+    """Process one file; return (rows, seconds), rows being None if it failed."""
+    start = time.perf_counter()
+    # The pool already spreads files over the cores; a PDF is extracted in this process
+    workers = 1 if path.lower().endswith(".pdf") else None
+    df = process_file(path, institute_mapping, output_format, output_dir, workers=workers, quarantine=quarantine,
+                      validate=validate)
+    return None if df is None else len(df), time.perf_counter() - start
+
+
+class FolderWatcher:
+    """Poll a directory and process its new and changed round files in a pool of worker processes.
+
+    files maps each round file seen to its status entry, the same dicts
+    written to the status file. A file's signature is only recorded once
+    it has been processed, so a file that changes while it is being parsed
+    is queued again afterwards.
+    """
+
+    def __init__(self, watch_dir, mapping_file=mapping_csv, output_format="xlsx", output_dir=".", jobs=1,
+                 interval=2.0, status_file=None, quarantine=False, validate=False):
+        self.watch_dir = watch_dir
+        self.mapping_file = mapping_file
+        self.output_format = output_format
+        self.output_dir = output_dir
+        self.jobs = max(jobs, 1)
+        self.interval = interval
+        self.status_file = status_file or os.path.join(output_dir, "watch_status.json")
+        self.quarantine = quarantine
+        self.validate = validate
+        self.files = {}
+        self.settling = {}  # path -> signature seen at the last poll, not yet stable
+        self.queue = deque()  # (path, signature, detected)
+        self.running = {}  # future -> (path, signature, detected, submitted)
+        self.institute_mapping = None
+        self.mapping_signature = None
+        self.mapping_loaded = False
+        self.started = time.time()
+        self.stopping = False
+        self.stopped = False
+
+    def stop(self, signum=None, frame=None):
+        """Stop queuing files; the running ones are finished first."""
+        if not self.stopping:
+            logger.info("Stopping the watcher after %s running files", len(self.running))
+        self.stopping = True
+
+    def load_status(self):
+        """Take the processed files of an earlier run from the status file."""
+        try:
+            with open(self.status_file) as file:
+                status = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable watch status %s: %s", self.status_file, e)
+            return
+        if status.get("version") != STATUS_VERSION:
+            return
+        for path, entry in status.get("files", {}).items():
+            if entry.get("status") == "done" and entry.get("signature"):
+                entry["signature"] = tuple(entry["signature"])
+                self.files[path] = entry
+        logger.info("Resuming with %s files already processed", len(self.files))
+
+    def refresh_mapping(self):
+        """Load the mapping CSV, again only when it changed since it was last loaded."""
+        signature = file_signature(self.mapping_file)
+        if self.mapping_loaded:
+            if signature == self.mapping_signature:
+                return
+            logger.info("Institute mapping %s changed, reloading", self.mapping_file)
+        self.mapping_signature = signature
+        self.mapping_loaded = True
+        self.institute_mapping = load_institute_mapping(self.mapping_file)
+
+    def scan(self, settle=True):
+        """Queue the round files that are new or changed and have stopped growing.
+
+        Without settle, files are queued on the poll that first sees them.
+        """
+        now = time.monotonic()
+        busy = {entry[0] for entry in self.running.values()} | {entry[0] for entry in self.queue}
+        seen = set()
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not is_round_file(entry.name):
+                    continue
+                path = entry.path
+                seen.add(path)
+                signature = file_signature(path)
+                if signature is None or path in busy:
+                    continue
+                known = self.files.get(path)
+                if known is not None and known.get("signature") == signature:
+                    continue
+                if settle and self.settling.get(path) != signature:
+                    self.settling[path] = signature
+                    continue
+                self.settling.pop(path, None)
+                logger.info("Queued %s", path)
+                self.queue.append((path, signature, now))
+        for path in set(self.files) - seen - busy:
+            del self.files[path]
+        for path in set(self.settling) - seen:
+            del self.settling[path]
+
+    def submit(self, pool):
+        """Hand queued files to the pool, keeping at most one file per worker in flight."""
+        while self.queue and len(self.running) < self.jobs and not self.stopping:
+            path, signature, detected = self.queue.popleft()
+            future = pool.submit(_process_in_worker, path, self.institute_mapping, self.output_format,
+                                 self.output_dir, self.quarantine, self.validate)
+            self.running[future] = (path, signature, detected, time.monotonic())
+            self.files.setdefault(path, {})["status"] = "running"
+
+    def collect(self, futures):
+        """Record the results of finished futures."""
+        for future in futures:
+            path, signature, detected, submitted = self.running.pop(future)
+            finished = time.monotonic()
+            try:
+                rows, seconds = future.result()
+            except Exception as e:
+                logger.error("Worker failed on %s: %s", path, e)
+                rows, seconds = None, finished - submitted
+            entry = {
+                "signature": signature,
+                "status": "failed" if rows is None else "done",
+                "rows": rows,
+                "seconds": round(seconds, 3),
+                "latency_seconds": round(finished - detected, 3),
+                "rows_per_second": round(rows / seconds) if rows and seconds else None,
+                "finished": _timestamp(time.time()),
+                "output": None if rows is None else output_path(
+                    os.path.splitext(os.path.basename(path))[0], self.output_format, self.output_dir),
+            }
+            self.files[path] = entry
+            if rows is None:
+                logger.error("Failed to process %s; see its extraction log", path)
+            else:
+                logger.info("Processed %s: %s rows in %.2f s, %.2f s after it was detected", path, rows, seconds,
+                            finished - detected)
+
+    def status(self):
+        """Return the watcher state as a JSON-serializable dict."""
+        done = [entry for entry in self.files.values() if entry.get("status") == "done"]
+        rows = sum(entry["rows"] for entry in done)
+        seconds = sum(entry["seconds"] for entry in done)
+        return {
+            "version": STATUS_VERSION,
+            "watch_dir": self.watch_dir,
+            "output_dir": self.output_dir,
+            "pid": os.getpid(),
+            "state": "stopped" if self.stopped else "stopping" if self.stopping else "watching",
+            "started": _timestamp(self.started),
+            "updated": _timestamp(time.time()),
+            "queue_depth": len(self.queue),
+            "settling": len(self.settling),
+            "running": sorted(entry[0] for entry in self.running.values()),
+            "processed": len(done),
+            "failed": sum(entry.get("status") == "failed" for entry in self.files.values()),
+            "rows": rows,
+            "rows_per_second": round(rows / seconds) if seconds else None,
+            "files": {path: self.files[path] for path in sorted(self.files)},
+        }
+
+    def write_status(self):
+        try:
+            with atomic_path(self.status_file) as temp_name, open(temp_name, "w", encoding="utf-8") as file:
+                json.dump(self.status(), file, indent=2)
+        except OSError as e:
+            logger.warning("Could not write watch status %s: %s", self.status_file, e)
+
+    def run(self, once=False):
+        """Watch until stopped, or with once set until the files present at start are processed."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.load_status()
+        self.refresh_mapping()
+        logger.info("Watching %s every %s s with %s workers", self.watch_dir, self.interval, self.jobs)
+        with ProcessPoolExecutor(self.jobs, initializer=_init_worker,
+                                 initargs=(logger.getEffectiveLevel(),)) as pool:
+            self.scan(settle=not once)
+            while True:
+                self.submit(pool)
+                self.write_status()
+                if not self.running and (self.stopping or (once and not self.queue)):
+                    break
+                if self.running:
+                    finished, _ = wait(self.running, timeout=self.interval, return_when=FIRST_COMPLETED)
+                    self.collect(finished)
+                else:
+                    time.sleep(self.interval)
+                if not once and not self.stopping:
+                    self.refresh_mapping()
+                    self.scan()
+        self.stopped = True
+        self.write_status()
+        return sum(entry.get("status") == "failed" for entry in self.files.values())
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(prog="cet-cutoffs watch",
+                                         description="Parse CAP round files as they arrive in a directory.")
+    arg_parser.add_argument("watch_dir", nargs="?", default="documents", help="Directory to watch for round files")
+    arg_parser.add_argument("--mapping", default=mapping_csv, help="Institute code/name mapping CSV")
+    arg_parser.add_argument("--format", dest="output_format", default="xlsx", choices=sorted(WRITERS),
+                            help="Output file format")
+    arg_parser.add_argument("--output-dir", default=".", help="Directory for outputs and extraction logs")
+    arg_parser.add_argument("--jobs", type=int, default=1, help="Process this many files at once")
+    arg_parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls of the directory")
+    arg_parser.add_argument("--status-file", default=None,
+                            help="Status JSON written after every poll (default <output-dir>/watch_status.json)")
+    arg_parser.add_argument("--once", action="store_true",
+                            help="Process the new and changed files present now, then exit")
+    arg_parser.add_argument("--quarantine", action="store_true",
+                            help="Set failing institute blocks of text inputs aside in <name>_quarantine.txt")
+    arg_parser.add_argument("--validate", action="store_true",
+                            help="Write the structural issues of each file to <name>_validation.<ext>")
+    arg_parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                            help="Lowest level written to the extraction logs")
+    args = arg_parser.parse_args(argv)
+
+    if not os.path.isdir(args.watch_dir):
+        arg_parser.error(f"{args.watch_dir} is not a directory")
+    logger.setLevel(args.log_level)
+    watcher = FolderWatcher(args.watch_dir, args.mapping, args.output_format, args.output_dir, args.jobs,
+                            args.interval, args.status_file, args.quarantine, args.validate)
+    signal.signal(signal.SIGINT, watcher.stop)
+    signal.signal(signal.SIGTERM, watcher.stop)
+    return 1 if watcher.run(args.once) else 0
+
+
+if __name__ == "__main__":
+    configure_logging()
+    raise SystemExit(main())